@@ -1,43 +1,17 @@
 # coding: utf-8
-from tornado import gen
-from tornado.testing import AsyncTestCase
-from opentracing.scope_managers.tornado import TornadoScopeManager
-from opentracing.mocktracer import MockTracer
-from opentracing import set_global_tracer, global_tracer
+from tornado_coroutines_opentracing.testing import TracingTestCase,\
+    TracingHTTPTestCase, is_parent_of, is_not_parent_of, has_no_parent
 
 
-class _Base(AsyncTestCase):
+__all__ = ['is_parent_of', 'is_not_parent_of', 'has_no_parent']
 
-    def setUp(self):
-        super(_Base, self).setUp()
-        set_global_tracer(MockTracer(TornadoScopeManager()))
 
-    def wait_finished_spans(self, count, timeout=5.0):
-        @gen.coroutine
-        def wait():
-            while len(global_tracer().finished_spans()) < count:
-                yield gen.moment
+class _Base(TracingTestCase):
+    pass
 
-        self.io_loop.run_sync(wait, timeout)
-        finished_spans = global_tracer().finished_spans()
-        assert len(finished_spans) == count
-        return finished_spans
 
-
-def is_parent_of(parent_span, *children):
-    for child in children:
-        assert parent_span.context.span_id == child.parent_id
-    return True
-
-
-def is_not_parent_of(parent_span, *children):
-    for child in children:
-        assert parent_span.context.span_id != child.parent_id
-    return True
-
-
-def has_no_parent(span):
-    return span.parent_id is None
+class _HTTPBase(TracingHTTPTestCase):
+    pass
 
 
 def empty_span(span, name):
@@ -53,3 +27,14 @@ def has_exception(span, name, exc):
     assert len(span.logs) == 1
     assert span.logs[0].key_values['error.object'] == exc
     return True
+
+
+def ff_span(span, name, exc=None):
+    """
+    Span of fire & forget coroutine with `operation_name`.
+    """
+    completion_time = span.tags.pop('ff.completion_time')
+    assert completion_time >= 0
+    if exc is None:
+        return empty_span(span, name)
+    return has_exception(span, name, exc)
@@ -0,0 +1,169 @@
+# coding: utf-8
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+
+from tornado_coroutines_opentracing import ff_coroutine
+
+from . import _Base, ff_span, is_parent_of
+
+
+@ff_coroutine(operation_name='coro', aggregate_after=2)
+def coro(delay=0.01, exc=None, child=False):
+    yield gen.sleep(delay)
+    if child:
+        with global_tracer().start_active_span(
+                operation_name='child',
+                child_of=global_tracer().active_span
+        ):
+            pass
+    if exc is not None:
+        raise exc
+
+
+class AggregateTestCase(_Base):
+
+    def spans(self, name):
+        return [
+            span for span in global_tracer().finished_spans()
+            if span.operation_name == name
+        ]
+
+    def test_summary_span(self):
+        with global_tracer().start_active_span('root') as scope:
+            root = scope.span
+            for i in range(5):
+                coro(exc=Exception('foobar') if i == 4 else None)
+
+        self.wait_finished_spans(4)
+
+        first, second, summary = self.spans('coro')
+        assert ff_span(first, 'coro')
+        assert ff_span(second, 'coro')
+        assert is_parent_of(root, first, second, summary)
+
+        assert summary.tags['ff.aggregated'] is True
+        assert summary.tags['ff.count'] == 3
+        assert summary.tags['ff.errors'] == 1
+        assert summary.tags['error'] is True
+        assert summary.tags['ff.latency.max'] == pytest.approx(0.01)
+        assert summary.tags['ff.latency.avg'] == pytest.approx(0.01)
+        histogram = dict(
+            (tag, count) for tag, count in summary.tags.items()
+            if tag.startswith('ff.latency.le_') or
+            tag.startswith('ff.latency.gt_')
+        )
+        assert histogram == {'ff.latency.le_10ms': 3}
+
+    def test_children_of_aggregated_coroutines(self):
+        with global_tracer().start_active_span('root'):
+            for _ in range(3):
+                coro(child=True)
+
+        self.wait_finished_spans(7)
+
+        first, second, summary = self.spans('coro')
+        children = self.spans('child')
+        assert is_parent_of(first, children[0])
+        assert is_parent_of(second, children[1])
+        assert is_parent_of(summary, children[2])
+
+    def test_aggregate_by_parent(self):
+        for name in ('root_1', 'root_2'):
+            with global_tracer().start_active_span(name):
+                for _ in range(3):
+                    coro()
+
+        self.wait_finished_spans(8)
+
+        root_1, root_2 = self.spans('root_1') + self.spans('root_2')
+        spans = self.spans('coro')
+        assert len(spans) == 6
+        assert len([s for s in spans if 'ff.aggregated' in s.tags]) == 2
+        assert len([
+            span for span in spans
+            if span.parent_id == root_1.context.span_id
+        ]) == 3
+
+    def test_one_summary_per_interval(self):
+
+        @ff_coroutine(operation_name='sync', aggregate_after=2)
+        def sync():
+            pass
+
+        @gen.coroutine
+        def fan_out():
+            for _ in range(100):
+                coro()
+                yield gen.sleep(0.001)
+
+        with global_tracer().start_active_span('root'):
+            for _ in range(1000):
+                sync()
+            self.io_loop.run_sync(fan_out)
+
+        self.wait_finished_spans(7)
+
+        for name, count in (('sync', 998), ('coro', 98)):
+            first, second, summary = self.spans(name)
+            assert 'ff.aggregated' not in first.tags
+            assert 'ff.aggregated' not in second.tags
+            assert summary.tags['ff.count'] == count
+
+    def test_new_summary_after_interval(self):
+        with global_tracer().start_active_span('root') as scope:
+            for _ in range(3):
+                coro()
+
+        self.wait_finished_spans(3)
+        # Summary waits for the end of the interval.
+        self.io_loop.run_sync(lambda: gen.sleep(0.5))
+        assert len(self.spans('coro')) == 2
+
+        with global_tracer().scope_manager.activate(scope.span, False):
+            coro()
+
+        self.wait_finished_spans(4)
+        assert self.io_loop.time() == pytest.approx(1.0)
+
+        with global_tracer().scope_manager.activate(scope.span, False):
+            for _ in range(2):
+                coro(delay=2.0)
+
+        self.wait_finished_spans(5)
+        # Summary is finished after the interval when counted coroutines
+        # are done.
+        assert self.io_loop.time() == pytest.approx(3.0)
+
+        summaries = [
+            span for span in self.spans('coro')
+            if 'ff.aggregated' in span.tags
+        ]
+        assert [s.tags['ff.count'] for s in summaries] == [2, 2]
+
+    def test_without_parent(self):
+        for _ in range(3):
+            coro()
+
+        spans = self.wait_finished_spans(3)
+        assert all('ff.aggregated' not in span.tags for span in spans)
+
+    def test_spawned_summary_span(self):
+
+        @ff_coroutine(operation_name='spawned', aggregate_after=1, spawn=True)
+        def spawned():
+            yield gen.moment
+
+        # Busy IOLoop delays the coroutines.
+        self.io_loop.add_callback(self.clock.advance, 0.5)
+        with global_tracer().start_active_span('root'):
+            for i in range(3):
+                spawned()
+
+        self.wait_finished_spans(3)
+
+        first, summary = self.spans('spawned')
+        assert first.tags['ff.schedule_delay'] == 0.5
+        assert summary.tags['ff.count'] == 2
+        assert summary.tags['ff.schedule_delay.max'] == 0.5
+        assert summary.tags['ff.schedule_delay.avg'] == 0.5
@@ -0,0 +1,142 @@
+# coding: utf-8
+import logging
+
+from opentracing import global_tracer
+from tornado import gen
+
+from tornado_coroutines_opentracing import ff_coroutine, ff_error_stats,\
+    reset_ff_error_stats, State
+
+from . import _Base
+
+
+@ff_coroutine
+def failed(exc):
+    yield gen.moment
+    raise exc
+
+
+@ff_coroutine(operation_name='traced')
+def traced(exc=None):
+    yield gen.moment
+    if exc is not None:
+        raise exc
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class ErrorsTestCase(_Base):
+
+    def setUp(self):
+        super(ErrorsTestCase, self).setUp()
+        reset_ff_error_stats()
+        self.handler = ListHandler()
+        self.logger = logging.getLogger('tornado_coroutines_opentracing')
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        State.error_log_limit = 10
+        State.error_log_interval = 60.0
+        reset_ff_error_stats()
+        super(ErrorsTestCase, self).tearDown()
+
+    def wait(self, seconds=0.01):
+        self.io_loop.run_sync(lambda: gen.sleep(seconds))
+
+    def test_stats(self):
+        failed(ValueError('foo'))
+        failed(ValueError('bar'))
+        failed(KeyError('baz'))
+        with global_tracer().start_active_span('root'):
+            traced(exc=ValueError('foo'))
+            traced()
+        self.wait()
+
+        assert ff_error_stats() == {
+            __name__ + '.failed': {'ValueError': 2, 'KeyError': 1},
+            __name__ + '.traced': {'ValueError': 1},
+        }
+
+        root, failed_span, span = global_tracer().finished_spans()
+        assert failed_span.tags['error'] is True
+        assert 'error' not in span.tags
+
+        assert len(self.handler.records) == 4
+        record = self.handler.records[0]
+        assert record.getMessage() == \
+            'Fire & forget coroutine {}.failed failed'.format(__name__)
+        assert str(record.exc_info[1]) == 'foo'
+
+    def test_awaited(self):
+        @gen.coroutine
+        def caller():
+            try:
+                yield failed(KeyError('foo'))
+            except KeyError:
+                pass
+            try:
+                yield [failed(KeyError('bar')), traced(ValueError('baz'))]
+            except (KeyError, ValueError):
+                pass
+
+        with global_tracer().start_active_span('root'):
+            self.io_loop.run_sync(caller)
+        self.wait()
+
+        assert ff_error_stats() == {}
+        assert self.handler.records == []
+        span, root = global_tracer().finished_spans()
+        assert span.operation_name == 'traced'
+        assert span.tags['error'] is True
+
+    def test_rate_limit(self):
+        State.error_log_limit = 2
+        State.error_log_interval = 0.05
+
+        for _ in range(3):
+            failed(ValueError('foo'))
+        failed(KeyError('bar'))
+        self.wait()
+        assert len(self.handler.records) == 2
+
+        # Summary at the end of the interval.
+        self.wait(0.06)
+        assert len(self.handler.records) == 3
+        assert self.handler.records[-1].getMessage() == (
+            'Fire & forget coroutines failed 2 times more: '
+            '{name} (KeyError): 1, {name} (ValueError): 1'
+        ).format(name=__name__ + '.failed')
+
+        # The next interval.
+        failed(ValueError('foo'))
+        self.wait()
+        assert len(self.handler.records) == 4
+        assert ff_error_stats()[__name__ + '.failed'] == {
+            'ValueError': 4, 'KeyError': 1,
+        }
+
+    def test_without_limit(self):
+        State.error_log_limit = None
+        for _ in range(20):
+            failed(ValueError('foo'))
+        self.wait()
+        assert len(self.handler.records) == 20
+
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            failed(ValueError('foo'))
+            self.wait()
+        finally:
+            State.enabled = True
+        assert ff_error_stats() == {}
+        assert self.handler.records == []
@@ -0,0 +1,151 @@
+# coding: utf-8
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+from tornado.testing import gen_test
+
+from tornado_coroutines_opentracing import ff_coroutine, State
+
+from . import _Base, empty_span, is_parent_of, has_no_parent, ff_span
+
+
+@ff_coroutine(operation_name='coro')
+def coro(value=None, exc=None):
+    yield gen.sleep(0.01)
+    with global_tracer().start_active_span(
+            operation_name='child',
+            child_of=global_tracer().active_span
+    ):
+        yield gen.moment
+    if exc is not None:
+        raise exc
+    raise gen.Return(value)
+
+
+@ff_coroutine(operation_name='nested')
+def nested():
+    coro()
+    yield gen.moment
+
+
+class FireAndForgetSpanTestCase(_Base):
+
+    def test_span(self):
+        with global_tracer().start_active_span('root'):
+            coro()
+
+        root, child, ff = self.wait_finished_spans(3)
+        assert empty_span(root, 'root')
+        assert ff_span(ff, 'coro')
+        assert empty_span(child, 'child')
+        assert is_parent_of(root, ff)
+        assert is_parent_of(ff, child)
+
+    def test_without_root_span(self):
+        coro()
+
+        child, ff = self.wait_finished_spans(2)
+        assert has_no_parent(ff)
+        assert is_parent_of(ff, child)
+
+    def test_nested(self):
+        with global_tracer().start_active_span('root'):
+            nested()
+
+        root, ff_nested, child, ff = self.wait_finished_spans(4)
+        assert ff_span(ff_nested, 'nested')
+        assert is_parent_of(root, ff_nested)
+        assert is_parent_of(ff_nested, ff)
+        assert is_parent_of(ff, child)
+
+    def test_exception(self):
+        exc = Exception('foobar')
+        with global_tracer().start_active_span('root'):
+            coro(exc=exc)
+
+        root, child, ff = self.wait_finished_spans(3)
+        assert empty_span(root, 'root')
+        assert ff_span(ff, 'coro', exc)
+
+    @gen_test
+    def test_yield(self):
+        with global_tracer().start_active_span('root'):
+            result = yield coro(value=42)
+            assert result == 42
+
+            with pytest.raises(Exception, match='foobar'):
+                yield coro(exc=Exception('foobar'))
+
+    def test_measure_time(self):
+
+        @ff_coroutine(operation_name='measured', measure_time=True)
+        def measured():
+            yield gen.moment
+
+        measured()
+        span, = self.wait_finished_spans(1)
+        assert span.operation_name == 'measured'
+        assert span.tags['coroutine.wall_time'] > 0
+        assert 'coroutine.cpu_time' in span.tags
+
+
+class SpawnTestCase(_Base):
+
+    def setUp(self):
+        super(SpawnTestCase, self).setUp()
+        self.started = []
+
+        @ff_coroutine(operation_name='spawned', spawn=True)
+        def spawned(value=None, exc=None):
+            self.started.append(value)
+            yield gen.sleep(0.01)
+            with global_tracer().start_active_span(
+                    operation_name='child',
+                    child_of=global_tracer().active_span
+            ):
+                pass
+            if exc is not None:
+                raise exc
+            raise gen.Return(value)
+
+        self.spawned = spawned
+
+    def test_schedule_delay(self):
+        # Busy IOLoop delays the coroutine.
+        self.io_loop.add_callback(self.clock.advance, 0.02)
+        with global_tracer().start_active_span('root'):
+            self.spawned()
+        # The first step is run on the next iteration of IOLoop.
+        assert self.started == []
+
+        root, child, ff = self.wait_finished_spans(3)
+        assert is_parent_of(root, ff)
+        assert is_parent_of(ff, child)
+        assert ff.operation_name == 'spawned'
+        assert ff.tags['ff.schedule_delay'] == pytest.approx(0.02)
+        assert ff.tags['ff.completion_time'] == pytest.approx(0.03)
+
+    @gen_test
+    def test_result(self):
+        result = yield self.spawned(value=42)
+        assert result == 42
+
+        with pytest.raises(Exception, match='foobar'):
+            yield self.spawned(exc=Exception('foobar'))
+
+        _, _, _, failed = global_tracer().finished_spans()
+        assert failed.tags['error'] is True
+
+    @gen_test
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            future = self.spawned(value=42)
+            assert self.started == []
+            result = yield future
+        finally:
+            State.enabled = True
+        assert result == 42
+
+        child, = global_tracer().finished_spans()
+        assert has_no_parent(child)
@@ -0,0 +1,161 @@
+# coding: utf-8
+import sys
+
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+from tornado.testing import gen_test
+
+from tornado_coroutines_opentracing import State
+from tornado_coroutines_opentracing.iterators import traced_iterator,\
+    trace_iterator, TracedIterator
+
+from . import _Base, empty_span, is_parent_of
+
+
+@traced_iterator
+def produce(count):
+    with global_tracer().start_active_span(
+            operation_name='produce',
+            child_of=global_tracer().active_span
+    ):
+        for i in range(count):
+            yield b'chunk'
+
+
+class AsyncProducer(object):
+    """
+    Asynchronous iterator based on Tornado coroutine.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+    def __aiter__(self):
+        return self
+
+    @gen.coroutine
+    def __anext__(self):
+        yield gen.moment
+        if not self.count:
+            raise StopAsyncIteration  # noqa: F821
+        self.count -= 1
+        with global_tracer().start_active_span(
+                operation_name='chunk',
+                child_of=global_tracer().active_span
+        ):
+            yield gen.moment
+        raise gen.Return(u'чанк')
+
+
+class TracedIteratorTestCase(_Base):
+
+    @gen_test
+    def test_keep_scope_between_steps(self):
+        with global_tracer().start_active_span('root'):
+            for chunk in produce(3):
+                with global_tracer().start_active_span(
+                        operation_name='write',
+                        child_of=global_tracer().active_span
+                ):
+                    yield gen.moment
+
+        spans = global_tracer().finished_spans()
+        writes = spans[:3]
+        produce_span, stream, root = spans[3:]
+
+        assert empty_span(root, 'root')
+        assert empty_span(produce_span, 'produce')
+        for write in writes:
+            assert empty_span(write, 'write')
+
+        assert is_parent_of(root, stream, *writes)
+        assert is_parent_of(stream, produce_span)
+
+        assert stream.operation_name == 'produce'
+        assert stream.tags['stream.chunks'] == 3
+        assert stream.tags['stream.bytes'] == 15
+        assert stream.tags['stream.chunk_latency.max'] >= 0
+        assert stream.tags['stream.chunk_latency.avg'] >= 0
+        assert len(stream.logs) == 0
+
+    def test_log_chunks(self):
+        stream = trace_iterator(
+            [b'foo', u'бар', 42], operation_name='list', log_chunks=True)
+        assert isinstance(stream, TracedIterator)
+        assert list(stream) == [b'foo', u'бар', 42]
+
+        span, = global_tracer().finished_spans()
+        assert span.operation_name == 'list'
+        assert span.tags['stream.chunks'] == 3
+        assert span.tags['stream.bytes'] == 9
+        assert [log.key_values['chunk.bytes'] for log in span.logs] == \
+            [3, 6, 0]
+
+    def test_exception(self):
+        exc = Exception('foobar')
+
+        @traced_iterator(operation_name='failed')
+        def failed():
+            yield b'foo'
+            raise exc
+
+        with pytest.raises(Exception, match='foobar'):
+            list(failed())
+
+        span, = global_tracer().finished_spans()
+        assert span.operation_name == 'failed'
+        assert span.tags['stream.chunks'] == 1
+        assert span.tags['error'] is True
+        assert len(span.logs) == 1
+        assert span.logs[0].key_values['error.object'] == exc
+
+    def test_close(self):
+        stream = produce(10)
+        assert next(stream) == b'chunk'
+        stream.close()
+
+        produce_span, stream_span = global_tracer().finished_spans()
+        assert is_parent_of(stream_span, produce_span)
+        assert stream_span.tags['stream.chunks'] == 1
+
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            stream = produce(1)
+        finally:
+            State.enabled = True
+        assert not isinstance(stream, TracedIterator)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5),
+                    reason='asynchronous iterators are not supported')
+class TracedAsyncIteratorTestCase(_Base):
+
+    @gen_test
+    def test_keep_scope_between_steps(self):
+        with global_tracer().start_active_span('root'):
+            stream = trace_iterator(AsyncProducer(2), 'async')
+            chunks = []
+            while True:
+                try:
+                    chunk = yield stream.__anext__()
+                except StopAsyncIteration:  # noqa: F821
+                    break
+                with global_tracer().start_active_span(
+                        operation_name='write',
+                        child_of=global_tracer().active_span
+                ):
+                    chunks.append(chunk)
+                    yield gen.moment
+
+        assert chunks == [u'чанк', u'чанк']
+
+        chunk_1, write_1, chunk_2, write_2, stream, root = \
+            global_tracer().finished_spans()
+
+        assert is_parent_of(root, stream, write_1, write_2)
+        assert is_parent_of(stream, chunk_1, chunk_2)
+
+        assert stream.tags['stream.chunks'] == 2
+        assert stream.tags['stream.bytes'] == 16
@@ -0,0 +1,228 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+
+from opentracing import global_tracer
+from tornado import gen
+from tornado.testing import gen_test
+
+from tornado_coroutines_opentracing import State
+from tornado_coroutines_opentracing.jobs import JobQueue, MemoryBackend,\
+    SQLiteBackend, ff_enqueue
+
+from . import _Base, empty_span, is_parent_of, has_no_parent, has_exception
+
+
+class CountingBackend(MemoryBackend):
+
+    def __init__(self):
+        super(CountingBackend, self).__init__()
+        self.writes = []
+
+    def put_many(self, jobs):
+        self.writes.append(len(jobs))
+        super(CountingBackend, self).put_many(jobs)
+
+
+class JobQueueTestCase(_Base):
+
+    def make_backend(self):
+        return CountingBackend()
+
+    def setUp(self):
+        super(JobQueueTestCase, self).setUp()
+        self.queue = JobQueue(self.make_backend(), batch_size=3)
+        self.results = []
+
+        @self.queue.handler('job')
+        def job(value):
+            yield gen.moment
+            with global_tracer().start_active_span(
+                    operation_name='inner',
+                    child_of=global_tracer().active_span
+            ):
+                self.results.append(value)
+
+    @gen_test
+    def test_job_is_child_of_producer_span(self):
+        with global_tracer().start_active_span('root'):
+            ff_enqueue(self.queue, 'job', 42)
+
+        count = yield self.queue.drain()
+        assert count == 1
+        assert self.results == [42]
+
+        root, inner, job = global_tracer().finished_spans()
+        assert empty_span(root, 'root')
+        assert empty_span(job, 'job')
+        assert empty_span(inner, 'inner')
+        assert is_parent_of(root, job)
+        assert is_parent_of(job, inner)
+
+    @gen_test
+    def test_job_without_producer_span(self):
+        ff_enqueue(self.queue, 'job', 42)
+
+        yield self.queue.drain()
+
+        inner, job = global_tracer().finished_spans()
+        assert has_no_parent(job)
+        assert is_parent_of(job, inner)
+
+    @gen_test
+    def test_unknown_job(self):
+        ff_enqueue(self.queue, 'unknown', 42)
+        ff_enqueue(self.queue, 'job', 43)
+
+        count = yield self.queue.drain()
+
+        assert count == 2
+        assert self.results == [43]
+
+    @gen_test
+    def test_exception_in_job(self):
+        exc = Exception('foobar')
+
+        @self.queue.handler('failed_job', operation_name='failed')
+        def failed_job():
+            raise exc
+
+        with global_tracer().start_active_span('root'):
+            ff_enqueue(self.queue, 'failed_job')
+            ff_enqueue(self.queue, 'job', 42)
+
+        yield self.queue.drain()
+
+        assert self.results == [42]
+        root, failed, inner, job = global_tracer().finished_spans()
+        assert has_exception(failed, 'failed', exc)
+        assert is_parent_of(root, failed, job)
+
+    @gen_test
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            with global_tracer().start_active_span('root'):
+                ff_enqueue(self.queue, 'job', 42)
+            yield self.queue.drain()
+        finally:
+            State.enabled = True
+
+        assert self.results == [42]
+        root, inner = global_tracer().finished_spans()
+        assert has_no_parent(inner)
+
+    @gen_test
+    def test_drain_by_batches(self):
+        for value in range(5):
+            ff_enqueue(self.queue, 'job', value)
+
+        count = yield self.queue.drain()
+        assert count == 3
+        count = yield self.queue.drain()
+        assert count == 2
+
+        assert self.results == [0, 1, 2, 3, 4]
+
+
+class JobQueueBatchWritesTestCase(_Base):
+
+    def test_write_on_next_iteration(self):
+        backend = CountingBackend()
+        queue = JobQueue(backend, batch_size=10)
+
+        ff_enqueue(queue, 'job', 1)
+        ff_enqueue(queue, 'job', 2)
+        assert backend.writes == []
+
+        self.io_loop.add_callback(self.stop)
+        self.wait()
+
+        assert backend.writes == [2]
+
+    def test_write_full_batch_immediately(self):
+        backend = CountingBackend()
+        queue = JobQueue(backend, batch_size=2)
+
+        for value in range(5):
+            ff_enqueue(queue, 'job', value)
+        assert backend.writes == [2, 2]
+
+        queue.flush()
+        assert backend.writes == [2, 2, 1]
+        assert len(backend) == 5
+
+
+class SQLiteJobQueueTestCase(JobQueueTestCase):
+
+    def make_backend(self):
+        self.path = os.path.join(self.tmp_dir, 'jobs.sqlite')
+        return SQLiteBackend(self.path)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        super(SQLiteJobQueueTestCase, self).setUp()
+
+    def tearDown(self):
+        self.queue.backend.close()
+        shutil.rmtree(self.tmp_dir)
+        super(SQLiteJobQueueTestCase, self).tearDown()
+
+    @gen_test
+    def test_jobs_survive_restart(self):
+        with global_tracer().start_active_span('root'):
+            ff_enqueue(self.queue, 'job', {'foo': 'bar'})
+        self.queue.flush()
+        self.queue.backend.close()
+
+        backend = SQLiteBackend(self.path)
+        assert len(backend) == 1
+        queue = JobQueue(backend)
+        queue.handler('job')(self.results.append)
+        self.queue.backend = backend
+
+        count = yield queue.drain()
+
+        assert count == 1
+        assert len(backend) == 0
+        assert self.results == [{'foo': 'bar'}]
+        root, job = global_tracer().finished_spans()
+        assert is_parent_of(root, job)
+
+    def test_taken_jobs_survive_restart(self):
+        for value in range(3):
+            ff_enqueue(self.queue, 'job', value)
+        self.queue.flush()
+
+        backend = self.queue.backend
+        taken = backend.get_many(2)
+        assert [job['args'] for _, job in taken] == [[0], [1]]
+        # Taken jobs aren't taken twice.
+        assert [job['args'] for _, job in backend.get_many(2)] == [[2]]
+        backend.close()
+
+        # Restart without acknowledgement.
+        self.queue.backend = SQLiteBackend(self.path)
+        assert len(self.queue.backend) == 3
+        taken = self.queue.backend.get_many(5)
+        assert [job['args'] for _, job in taken] == [[0], [1], [2]]
+
+        self.queue.backend.ack([job_id for job_id, _ in taken[:2]])
+        assert len(self.queue.backend) == 1
+
+    @gen_test
+    def test_jobs_are_removed_when_done(self):
+        sizes = []
+
+        @self.queue.handler('size')
+        def size():
+            yield gen.moment
+            sizes.append(len(self.queue.backend))
+
+        ff_enqueue(self.queue, 'size')
+        ff_enqueue(self.queue, 'size')
+        yield self.queue.drain()
+
+        assert sizes == [2, 2]
+        assert len(self.queue.backend) == 0
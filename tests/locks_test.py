@@ -0,0 +1,162 @@
+# coding: utf-8
+from datetime import timedelta
+
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+from tornado.testing import gen_test
+
+from tornado_coroutines_opentracing import ff_coroutine, State
+from tornado_coroutines_opentracing.locks import Lock, Semaphore,\
+    BoundedSemaphore, Condition
+
+from . import _Base
+
+
+def events(span):
+    return [log.key_values['event'] for log in span.logs]
+
+
+class LockTestCase(_Base):
+
+    def setUp(self):
+        super(LockTestCase, self).setUp()
+        self.lock = Lock(name='resource')
+
+        @ff_coroutine
+        def hold(name, seconds):
+            with global_tracer().start_active_span(
+                    operation_name=name,
+                    child_of=global_tracer().active_span
+            ):
+                with (yield self.lock.acquire()):
+                    yield gen.sleep(seconds)
+
+        self.hold = hold
+
+    def test_wait_and_hold_time(self):
+        with global_tracer().start_active_span('root'):
+            self.hold('first', 0.05)
+            self.hold('second', 0.01)
+
+        _, first, second = self.wait_finished_spans(3)
+
+        assert events(first) == ['lock.acquired', 'lock.released']
+        assert events(second) == ['lock.acquired', 'lock.released']
+        acquired, released = first.logs
+        assert acquired.key_values['lock'] == 'resource'
+        assert acquired.key_values['lock.wait_time'] == 0.0
+        assert 0.04 <= released.key_values['lock.hold_time'] < 0.1
+
+        acquired, released = second.logs
+        assert 0.04 <= acquired.key_values['lock.wait_time'] < 0.1
+        assert 0.005 <= released.key_values['lock.hold_time'] < 0.05
+
+        stats = self.lock.stats()
+        assert stats['acquisitions'] == 2
+        assert stats['contentions'] == 1
+        assert stats['timeouts'] == 0
+        assert stats['wait_time'] == stats['max_wait_time']
+        assert 0.05 <= stats['hold_time'] < 0.15
+        assert stats['max_hold_time'] < stats['hold_time']
+
+    @gen_test
+    def test_timeout(self):
+        yield self.lock.acquire()
+        with global_tracer().start_active_span('root') as scope:
+            with pytest.raises(gen.TimeoutError):
+                yield self.lock.acquire(timeout=timedelta(seconds=0.01))
+        self.lock.release()
+
+        assert events(scope.span) == ['lock.timeout']
+        assert self.lock.stats()['timeouts'] == 1
+        assert self.lock.stats()['acquisitions'] == 1
+
+    @gen_test
+    def test_release_unlocked(self):
+        with pytest.raises(RuntimeError):
+            self.lock.release()
+
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            with global_tracer().start_active_span('root'):
+                self.hold('first', 0.01)
+            first, = self.wait_finished_spans(1)
+        finally:
+            State.enabled = True
+
+        assert first.logs == []
+        assert self.lock.stats()['acquisitions'] == 0
+
+
+class SemaphoreTestCase(_Base):
+
+    @gen_test
+    def test_semaphore(self):
+        semaphore = Semaphore(2)
+        with global_tracer().start_active_span('root') as scope:
+            yield semaphore.acquire()
+            yield semaphore.acquire()
+            waiter = semaphore.acquire()
+            semaphore.release()
+            yield waiter
+            semaphore.release()
+            semaphore.release()
+
+        assert events(scope.span) == [
+            'lock.acquired', 'lock.acquired', 'lock.released',
+            'lock.acquired', 'lock.released', 'lock.released',
+        ]
+        assert 'lock' not in scope.span.logs[0].key_values
+        stats = semaphore.stats()
+        assert stats['acquisitions'] == 3
+        assert stats['contentions'] == 1
+
+    @gen_test
+    def test_bounded_semaphore(self):
+        semaphore = BoundedSemaphore(1, name='bounded')
+        yield semaphore.acquire()
+        semaphore.release()
+        with pytest.raises(ValueError):
+            semaphore.release()
+        assert semaphore.stats()['acquisitions'] == 1
+
+
+class ConditionTestCase(_Base):
+
+    @gen_test
+    def test_condition(self):
+        condition = Condition(name='ready')
+        with global_tracer().start_active_span('root') as scope:
+            waiter = condition.wait()
+            yield gen.sleep(0.01)
+            condition.notify()
+            assert (yield waiter) is True
+            assert not (yield condition.wait(timeout=timedelta(seconds=0.01)))
+
+        notified, timeout = scope.span.logs
+        assert notified.key_values['event'] == 'condition.notified'
+        assert notified.key_values['lock'] == 'ready'
+        assert notified.key_values['condition.wait_time'] >= 0.005
+        assert timeout.key_values['event'] == 'condition.timeout'
+
+        stats = condition.stats()
+        assert stats['waits'] == 2
+        assert stats['timeouts'] == 1
+
+    @gen_test
+    def test_timeouts_without_notify(self):
+        condition = Condition()
+        semaphore = Semaphore(0)
+        timeout = timedelta(seconds=0.001)
+        for _ in range(1000):
+            assert not (yield condition.wait(timeout=timeout))
+            with pytest.raises(gen.TimeoutError):
+                yield semaphore.acquire(timeout=timeout)
+
+        # Timed out waiters aren't kept.
+        assert len(condition._traced_waiters) <= 100
+        assert len(semaphore._traced_waiters) <= 100
+        assert condition.stats()['timeouts'] == 1000
+        assert semaphore.stats()['timeouts'] == 1000
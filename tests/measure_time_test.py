@@ -0,0 +1,131 @@
+# coding: utf-8
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+from tornado.testing import gen_test
+
+from tornado_coroutines_opentracing import ff_coroutine, coroutine_stats,\
+    reset_coroutine_stats, _cpu_clock
+
+from . import _Base, empty_span, is_parent_of
+
+
+def burn(seconds):
+    # CPU time of the thread, it's less than wall time under contention.
+    deadline = _cpu_clock() + seconds
+    while _cpu_clock() < deadline:
+        pass
+
+
+@ff_coroutine(measure_time=True)
+def busy(value=None, exc=None):
+    with global_tracer().start_active_span(
+            operation_name='busy',
+            child_of=global_tracer().active_span
+    ):
+        burn(0.02)
+        yield gen.sleep(0.1)
+        burn(0.02)
+    yield gen.moment
+    if exc is not None:
+        raise exc
+    raise gen.Return(value)
+
+
+@ff_coroutine(measure_time=True)
+def sync(value):
+    burn(0.01)
+    return value
+
+
+class MeasureTimeTestCase(_Base):
+
+    name = __name__ + '.busy'
+
+    def setUp(self):
+        super(MeasureTimeTestCase, self).setUp()
+        reset_coroutine_stats()
+
+    def test_tags_of_active_spans(self):
+        with global_tracer().start_active_span('root'):
+            busy()
+
+        root, span = self.wait_finished_spans(2)
+        assert empty_span(root, 'root')
+        assert is_parent_of(root, span)
+
+        # Step that closes the span is counted until the span is closed.
+        cpu_time = span.tags['coroutine.cpu_time']
+        wall_time = span.tags['coroutine.wall_time']
+        assert cpu_time >= 0.04
+        assert wall_time >= 0.04
+
+    def test_span_inside_step(self):
+
+        @ff_coroutine(measure_time=True)
+        def coro():
+            yield gen.moment
+            burn(0.01)
+            with global_tracer().start_active_span(
+                    operation_name='inner',
+                    child_of=global_tracer().active_span
+            ):
+                burn(0.02)
+            burn(0.01)
+
+        coro()
+        inner, = self.wait_finished_spans(1)
+
+        assert inner.tags['coroutine.cpu_time'] >= 0.02
+        assert inner.tags['coroutine.wall_time'] >= 0.02
+
+    def test_stats(self):
+        for _ in range(2):
+            busy()
+        self.wait_finished_spans(2)
+        # Let coroutines finish their last step.
+        self.io_loop.run_sync(lambda: gen.sleep(0.01))
+
+        stats = coroutine_stats()[self.name]
+        assert stats['calls'] == 2
+        assert stats['steps'] == 6
+        assert stats['cpu_time'] >= 0.08
+        assert stats['wall_time'] >= 0.08
+
+    @gen_test
+    def test_result(self):
+        result = yield busy(value=42)
+        assert result == 42
+
+        result = yield sync('foobar')
+        assert result == 'foobar'
+
+        stats = coroutine_stats()[__name__ + '.sync']
+        assert stats['calls'] == 1
+        assert stats['steps'] == 1
+        assert stats['wall_time'] >= 0.01
+
+    @gen_test
+    def test_exception(self):
+        with pytest.raises(Exception, match='foobar'):
+            yield busy(exc=Exception('foobar'))
+
+        assert coroutine_stats()[self.name]['steps'] == 3
+
+    @gen_test
+    def test_exception_thrown_into_coroutine(self):
+
+        @gen.coroutine
+        def failed():
+            yield gen.moment
+            raise Exception('foobar')
+
+        @ff_coroutine(measure_time=True)
+        def coro():
+            try:
+                yield failed()
+            except Exception as e:
+                raise gen.Return(str(e))
+
+        result = yield coro()
+        assert result == 'foobar'
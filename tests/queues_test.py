@@ -0,0 +1,208 @@
+# coding: utf-8
+import functools
+
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+from tornado.testing import gen_test
+
+from tornado_coroutines_opentracing import State, set_sampling_predicate
+from tornado_coroutines_opentracing.queues import TracedQueue
+
+from . import _Base, empty_span, is_parent_of, has_no_parent
+
+
+class TracedQueueTestCase(_Base):
+
+    def setUp(self):
+        super(TracedQueueTestCase, self).setUp()
+        self.queue = TracedQueue()
+        self.results = []
+
+    @gen.coroutine
+    def handle(self, item):
+        yield gen.sleep(0.01)
+        with global_tracer().start_active_span(
+                operation_name='inner',
+                child_of=global_tracer().active_span
+        ):
+            self.results.append(item)
+        raise gen.Return(item * 2)
+
+    @gen_test
+    def test_process(self):
+        with global_tracer().start_active_span('producer'):
+            yield self.queue.put(1)
+        yield gen.sleep(0.02)
+
+        result = yield self.queue.process(self.handle)
+        assert result == 2
+        assert self.results == [1]
+
+        producer, inner, handle = global_tracer().finished_spans()
+        assert empty_span(producer, 'producer')
+        assert empty_span(inner, 'inner')
+        assert handle.operation_name == 'handle'
+        assert 0.02 <= handle.tags['queue.wait_time'] < 0.1
+        assert is_parent_of(producer, handle)
+        assert is_parent_of(handle, inner)
+
+        # Item is marked as done.
+        yield self.queue.join(timeout=0.1)
+
+    @gen_test
+    def test_waiting_worker(self):
+        worker = self.queue.process(self.handle, operation_name='worker')
+
+        with global_tracer().start_active_span('producer'):
+            self.queue.put_nowait(1)
+
+        yield worker
+
+        producer, inner, handle = global_tracer().finished_spans()
+        assert handle.operation_name == 'worker'
+        assert is_parent_of(producer, handle)
+        assert is_parent_of(handle, inner)
+
+    @gen_test
+    def test_concurrent_workers(self):
+        for i in range(3):
+            with global_tracer().start_active_span('producer'):
+                self.queue.put_nowait(i)
+
+        yield [self.queue.process(self.handle) for _ in range(3)]
+        assert sorted(self.results) == [0, 1, 2]
+
+        spans = global_tracer().finished_spans()
+        producers = [s for s in spans if s.operation_name == 'producer']
+        handles = [s for s in spans if s.operation_name == 'handle']
+        inners = [s for s in spans if s.operation_name == 'inner']
+        for producer, handle in zip(producers, handles):
+            assert is_parent_of(producer, handle)
+        assert sorted(s.parent_id for s in inners) == \
+            sorted(s.context.span_id for s in handles)
+
+    @gen_test
+    def test_process_many(self):
+        with global_tracer().start_active_span('first'):
+            self.queue.put_nowait(1)
+        with global_tracer().start_active_span('second'):
+            self.queue.put_nowait(2)
+        self.queue.put_nowait(3)
+
+        def handle_many(items):
+            self.results.extend(items)
+
+        yield self.queue.process_many(handle_many, 2)
+        assert self.results == [1, 2]
+        assert self.queue.qsize() == 1
+
+        first, second, handle = global_tracer().finished_spans()
+        assert handle.operation_name == 'handle_many'
+        assert handle.tags['queue.items'] == 2
+        # Mock tracer keeps only the first reference.
+        assert is_parent_of(first, handle)
+
+    @gen_test
+    def test_exception(self):
+        self.queue.put_nowait(1)
+
+        def failed(item):
+            raise Exception('foobar')
+
+        with pytest.raises(Exception, match='foobar'):
+            yield self.queue.process(failed)
+
+        span, = global_tracer().finished_spans()
+        assert has_no_parent(span)
+        assert span.tags['error'] is True
+        assert str(span.logs[0].key_values['error.object']) == 'foobar'
+        yield self.queue.join(timeout=0.1)
+
+    @gen_test
+    def test_partial_handler(self):
+
+        @gen.coroutine
+        def scale(factor, item):
+            yield gen.sleep(0.01)
+            raise gen.Return(item * factor)
+
+        class Handler(object):
+
+            def __call__(self, item):
+                return item + 1
+
+        for i in (1, 2):
+            self.queue.put_nowait(i)
+
+        # Coroutine is awaited.
+        result = yield self.queue.process(functools.partial(scale, 3))
+        assert result == 3
+        result = yield self.queue.process(Handler())
+        assert result == 3
+
+        scale_span, handler_span = global_tracer().finished_spans()
+        assert scale_span.operation_name == 'queue.process'
+        assert handler_span.operation_name == 'queue.process'
+        yield self.queue.join(timeout=0.1)
+
+    @gen_test
+    def test_plain_get(self):
+        with global_tracer().start_active_span('producer'):
+            for i in range(4):
+                yield self.queue.put(i)
+
+        assert (yield self.queue.get()) == 0
+        assert self.queue.get_nowait() == 1
+        assert (yield self.queue.get_many(5)) == [2, 3]
+
+        getter = self.queue.get()
+        self.queue.put_nowait(4)
+        assert (yield getter) == 4
+        assert len(global_tracer().finished_spans()) == 1
+
+    @gen_test
+    def test_full_queue(self):
+        queue = TracedQueue(maxsize=1)
+        with global_tracer().start_active_span('first'):
+            queue.put_nowait(1)
+        with global_tracer().start_active_span('second'):
+            putter = queue.put(2)
+
+        yield queue.process(self.handle)
+        yield putter
+        yield queue.process(self.handle)
+        assert self.results == [1, 2]
+
+        first, second, _, handle_first, _, handle_second = \
+            global_tracer().finished_spans()
+        assert is_parent_of(first, handle_first)
+        assert is_parent_of(second, handle_second)
+
+    @gen_test
+    def test_unsampled(self):
+        set_sampling_predicate(
+            lambda context: context.baggage.get('sampled') != '0')
+        try:
+            with global_tracer().start_active_span('producer') as scope:
+                scope.span.set_baggage_item('sampled', '0')
+                self.queue.put_nowait(1)
+            yield self.queue.process(self.handle)
+        finally:
+            set_sampling_predicate()
+
+        assert self.results == [1]
+        assert len(global_tracer().finished_spans()) == 2
+
+    @gen_test
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            with global_tracer().start_active_span('producer'):
+                self.queue.put_nowait(1)
+            yield self.queue.process(self.handle)
+        finally:
+            State.enabled = True
+
+        producer, inner = global_tracer().finished_spans()
+        assert has_no_parent(inner)
@@ -0,0 +1,197 @@
+# coding: utf-8
+from opentracing import global_tracer
+from tornado import gen
+from tornado.web import Application, RequestHandler
+
+from tornado_coroutines_opentracing import ff_coroutine, sampled_by_flags,\
+    set_sampling_predicate, tracer_stack_context
+from tornado_coroutines_opentracing.iterators import trace_iterator,\
+    TracedIterator
+from tornado_coroutines_opentracing.web import TracingHandlerMixin
+
+from . import _Base, _HTTPBase, ff_span, is_parent_of
+
+
+def baggage_sampled(span_context):
+    return span_context.baggage.get('sampled') != '0'
+
+
+scopes = []
+
+
+@ff_coroutine(operation_name='coro')
+def coro():
+    scopes.append(global_tracer().scope_manager.active)
+    nested()
+    yield gen.moment
+
+
+@ff_coroutine(operation_name='nested')
+def nested():
+    scopes.append(global_tracer().scope_manager.active)
+    yield gen.sleep(0.01)
+    with global_tracer().start_active_span(
+            operation_name='child',
+            child_of=global_tracer().active_span
+    ):
+        pass
+
+
+class Context(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class SamplingTestCase(_Base):
+
+    def setUp(self):
+        super(SamplingTestCase, self).setUp()
+        set_sampling_predicate(baggage_sampled)
+        del scopes[:]
+
+    def tearDown(self):
+        set_sampling_predicate()
+        super(SamplingTestCase, self).tearDown()
+
+    def test_unsampled(self):
+        span = global_tracer().start_span('root')
+        span.set_baggage_item('sampled', '0')
+        with tracer_stack_context(span):
+            coro()
+
+        child, = self.wait_finished_spans(1)
+        span.finish()
+        assert child.operation_name == 'child'
+        assert is_parent_of(span, child)
+
+        # Coroutines share base scope of the parent.
+        scope, nested_scope = scopes
+        assert scope is nested_scope
+        assert scope.span is span
+
+    def test_unsampled_scopes_are_isolated(self):
+        @ff_coroutine
+        def background():
+            with global_tracer().start_active_span(
+                    operation_name='background',
+                    child_of=global_tracer().active_span
+            ):
+                yield gen.sleep(0.02)
+
+        @gen.coroutine
+        def caller():
+            with global_tracer().start_active_span(
+                    operation_name='caller',
+                    child_of=global_tracer().active_span
+            ):
+                background()
+                with global_tracer().start_active_span(
+                        operation_name='nested',
+                        child_of=global_tracer().active_span
+                ):
+                    yield gen.sleep(0.01)
+                assert global_tracer().active_span.operation_name == \
+                    'caller'
+            raise gen.Return(global_tracer().active_span)
+
+        root = global_tracer().start_span('root')
+        root.set_baggage_item('sampled', '0')
+        with tracer_stack_context(root):
+            active_span = self.io_loop.run_sync(caller)
+
+        assert active_span is root
+        nested, caller_span, background_span = self.wait_finished_spans(3)
+        assert nested.operation_name == 'nested'
+        assert is_parent_of(caller_span, nested, background_span)
+        assert is_parent_of(root, caller_span)
+
+    def test_unsampled_without_stack_context(self):
+        """
+        Without stack context of the caller, parent span is propagated to
+        keep unsampled trace.
+        """
+        with global_tracer().start_active_span('root') as scope:
+            scope.span.set_baggage_item('sampled', '0')
+            nested()
+
+        root, child = self.wait_finished_spans(2)
+        assert child.operation_name == 'child'
+        assert is_parent_of(root, child)
+
+    def test_sampled(self):
+        with global_tracer().start_active_span('root') as scope:
+            coro()
+
+        root, ff, child, ff_nested = self.wait_finished_spans(4)
+        assert ff_span(ff, 'coro')
+        assert ff_span(ff_nested, 'nested')
+        assert is_parent_of(root, ff)
+        assert is_parent_of(ff, ff_nested)
+        assert is_parent_of(ff_nested, child)
+        assert scopes[0] is not scope
+
+    def test_iterator(self):
+        with global_tracer().start_active_span('root') as scope:
+            scope.span.set_baggage_item('sampled', '0')
+            assert trace_iterator([1, 2]) == [1, 2]
+
+        with global_tracer().start_active_span('root'):
+            assert isinstance(trace_iterator([1, 2]), TracedIterator)
+
+    def test_default_predicate(self):
+        assert sampled_by_flags(Context()) is True
+        assert sampled_by_flags(Context(sampled=True)) is True
+        assert sampled_by_flags(Context(sampled=False)) is False
+        assert sampled_by_flags(Context(flags=1)) is True
+        assert sampled_by_flags(Context(flags=3)) is True
+        assert sampled_by_flags(Context(flags=2)) is False
+
+
+class Handler(TracingHandlerMixin, RequestHandler):
+
+    def get(self):
+        with global_tracer().start_active_span(
+                operation_name='handler',
+                child_of=global_tracer().active_span
+        ):
+            self.write('ok')
+
+
+class SamplingHandlerTestCase(_HTTPBase):
+
+    def setUp(self):
+        super(SamplingHandlerTestCase, self).setUp()
+        set_sampling_predicate(baggage_sampled)
+
+    def tearDown(self):
+        set_sampling_predicate()
+        super(SamplingHandlerTestCase, self).tearDown()
+
+    def get_app(self):
+        return Application([('/', Handler)])
+
+    def fetch_with_baggage(self, **baggage):
+        with global_tracer().start_active_span('client') as scope:
+            for key, value in baggage.items():
+                scope.span.set_baggage_item(key, value)
+            headers = {}
+            global_tracer().inject(scope.span.context, 'http_headers', headers)
+        return self.fetch('/', headers=headers)
+
+    def test_unsampled_incoming_context(self):
+        response = self.fetch_with_baggage(sampled='0')
+        assert response.code == 200
+
+        client, handler, root = global_tracer().finished_spans()
+        assert root.tags['sampling.priority'] == 0
+        assert is_parent_of(client, root)
+        assert is_parent_of(root, handler)
+
+    def test_sampled_incoming_context(self):
+        response = self.fetch_with_baggage()
+        assert response.code == 200
+
+        client, handler, root = global_tracer().finished_spans()
+        assert is_parent_of(client, root)
+        assert is_parent_of(root, handler)
@@ -0,0 +1,91 @@
+# coding: utf-8
+import time
+
+import pytest
+from opentracing import global_tracer
+from tornado import gen
+from tornado.ioloop import TimeoutError
+
+from tornado_coroutines_opentracing import ff_coroutine
+from tornado_coroutines_opentracing.testing import VirtualClock,\
+    virtual_time_io_loop, find_orphans
+
+from . import _Base, ff_span, is_parent_of
+
+
+@ff_coroutine(operation_name='sleepy')
+def sleepy(delay):
+    yield gen.sleep(delay)
+
+
+class VirtualClockTestCase(_Base):
+
+    def test_sleep_takes_no_real_time(self):
+        start = time.time()
+        loop_start = self.io_loop.time()
+
+        self.io_loop.run_sync(lambda: gen.sleep(3600))
+
+        assert self.io_loop.time() - loop_start == pytest.approx(3600)
+        assert time.time() - start < 1
+
+    def test_timeouts_order(self):
+        calls = []
+        for delay in (30, 10, 20):
+            self.io_loop.call_later(delay, calls.append, delay)
+
+        self.io_loop.run_sync(lambda: gen.sleep(60))
+        assert calls == [10, 20, 30]
+
+    def test_advance(self):
+        clock = VirtualClock(start=100.0)
+        clock.advance(0.5)
+        assert clock.time() == 100.5
+        clock.advance(0)
+        assert clock.time() > 100.5
+
+    def test_virtual_time_io_loop(self):
+        clock = VirtualClock()
+        loop = virtual_time_io_loop(clock)
+        try:
+            loop.run_sync(lambda: gen.sleep(5))
+            assert loop.clock is clock
+            assert clock.time() == pytest.approx(5)
+        finally:
+            loop.close(all_fds=True)
+
+
+class TracingTestCaseTestCase(_Base):
+
+    def test_wait_finished_spans(self):
+        with global_tracer().start_active_span('root') as scope:
+            root = scope.span
+            sleepy(60)
+
+        finished, = self.wait_finished_spans(1)
+        assert finished is root
+
+        root, child = self.wait_finished_spans(2)
+        assert ff_span(child, 'sleepy')
+        assert is_parent_of(root, child)
+        self.assert_no_orphans()
+
+    def test_wait_finished_spans_timeout(self):
+        with global_tracer().start_active_span('root'):
+            sleepy(60)
+
+        with pytest.raises(TimeoutError):
+            self.wait_finished_spans(2, timeout=30)
+
+    def test_orphans(self):
+        root = global_tracer().start_span('root')
+        with global_tracer().start_active_span('child', child_of=root):
+            pass
+
+        child, = global_tracer().finished_spans()
+        assert find_orphans([child]) == [child]
+        with pytest.raises(AssertionError, match='child'):
+            self.assert_no_orphans()
+
+        root.finish()
+        self.assert_no_orphans()
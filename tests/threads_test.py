@@ -0,0 +1,164 @@
+# coding: utf-8
+import gc
+import os
+import threading
+import unittest
+
+from opentracing import global_tracer
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from tornado_coroutines_opentracing import ff_coroutine, coroutine_stats,\
+    reset_coroutine_stats, ff_error_stats, reset_ff_error_stats,\
+    reset_after_fork
+
+from . import _Base
+
+
+THREADS = 8
+CALLS = 50
+
+
+@ff_coroutine(operation_name='worker', measure_time=True,
+              aggregate_after=CALLS // 2)
+def worker(index):
+    for _ in range(3):
+        yield gen.moment
+        with global_tracer().start_active_span(
+                operation_name='step',
+                child_of=global_tracer().active_span
+        ):
+            yield gen.moment
+    if index % 10 == 0:
+        raise ValueError(index)
+
+
+@ff_coroutine
+def launcher(calls):
+    yield gen.moment
+    for index in range(calls):
+        worker(index)
+        yield gen.moment
+
+
+def run_loop(roots, errors):
+    loop = IOLoop()
+    loop.make_current()
+    try:
+        @gen.coroutine
+        def main():
+            with global_tracer().start_active_span('root') as scope:
+                roots.append(scope.span)
+                launcher(CALLS)
+            while len(worker_spans(scope.span)) < CALLS // 2 + 1:
+                yield gen.sleep(0.001)
+
+        loop.run_sync(main, timeout=30)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        loop.clear_current()
+        loop.close(all_fds=True)
+
+
+def worker_spans(root):
+    return [
+        span for span in global_tracer().finished_spans()
+        if span.operation_name == 'worker' and
+        span.context.trace_id == root.context.trace_id
+    ]
+
+
+class ThreadsTestCase(_Base):
+
+    def setUp(self):
+        super(ThreadsTestCase, self).setUp()
+        reset_coroutine_stats()
+        reset_ff_error_stats()
+
+    def tearDown(self):
+        reset_ff_error_stats()
+        super(ThreadsTestCase, self).tearDown()
+
+    def test_loops_in_threads(self):
+        roots = []
+        errors = []
+        threads = [
+            threading.Thread(target=run_loop, args=(roots, errors))
+            for _ in range(THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert len(roots) == THREADS
+
+        spans = global_tracer().finished_spans()
+        by_id = dict((span.context.span_id, span) for span in spans)
+        trace_ids = set(root.context.trace_id for root in roots)
+        assert len(trace_ids) == THREADS
+
+        for span in spans:
+            # Spans never cross traces of other loops.
+            assert span.context.trace_id in trace_ids
+            if span.parent_id is not None:
+                parent = by_id[span.parent_id]
+                assert parent.context.trace_id == span.context.trace_id
+
+        for root in roots:
+            workers = worker_spans(root)
+            individual = [s for s in workers if 'ff.aggregated' not in s.tags]
+            summaries = [s for s in workers if 'ff.aggregated' in s.tags]
+            assert len(individual) == CALLS // 2
+            summary, = summaries
+            assert summary.tags['ff.count'] == CALLS - CALLS // 2
+            for span in workers:
+                assert span.parent_id == root.context.span_id
+
+        steps = [span for span in spans if span.operation_name == 'step']
+        assert len(steps) == THREADS * CALLS * 3
+
+        # Statistics of closed loops are kept.
+        del threads
+        gc.collect()
+        name = __name__ + '.worker'
+        assert coroutine_stats()[name]['calls'] == THREADS * CALLS
+        assert ff_error_stats()[name] == {'ValueError': THREADS * CALLS // 10}
+
+
+@unittest.skipIf(not hasattr(os, 'fork'), 'fork() is not available')
+class ForkTestCase(_Base):
+
+    def test_reset_after_fork(self):
+        with global_tracer().start_active_span('root'):
+            worker(0)
+        self.wait_finished_spans(5)
+        # Unretrieved failure is counted on the next iteration of IOLoop.
+        self.io_loop.run_sync(lambda: gen.sleep(0.01))
+        assert coroutine_stats()
+        assert ff_error_stats()
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                if not hasattr(os, 'register_at_fork'):
+                    reset_after_fork()
+                clean = not coroutine_stats() and not ff_error_stats()
+                os.write(write_fd, b'1' if clean else b'0')
+            finally:
+                os._exit(0)
+
+        os.close(write_fd)
+        try:
+            result = os.read(read_fd, 1)
+        finally:
+            os.close(read_fd)
+            os.waitpid(pid, 0)
+
+        assert result == b'1'
+        # State of the parent is kept.
+        assert coroutine_stats()
@@ -0,0 +1,163 @@
+# coding: utf-8
+from opentracing import global_tracer
+from tornado import gen
+from tornado.web import Application, RequestHandler, HTTPError
+
+from tornado_coroutines_opentracing import ff_coroutine, State, _is_sampled
+from tornado_coroutines_opentracing.web import TracingHandlerMixin
+
+from . import _HTTPBase, empty_span, is_parent_of, has_no_parent
+
+
+scopes = []
+
+
+@ff_coroutine
+def background():
+    scopes.append(global_tracer().scope_manager.active)
+    yield gen.sleep(0.05)
+    with global_tracer().start_active_span(
+            operation_name='background',
+            child_of=global_tracer().active_span
+    ):
+        yield gen.moment
+
+
+class Handler(TracingHandlerMixin, RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        scopes.append(global_tracer().scope_manager.active)
+        background()
+        with global_tracer().start_active_span(
+                operation_name='handler',
+                child_of=global_tracer().active_span
+        ):
+            yield gen.moment
+        self.write('ok')
+
+
+class FailedHandler(TracingHandlerMixin, RequestHandler):
+
+    trace_operation_name = 'failed'
+
+    def get(self):
+        raise Exception('foobar')
+
+
+class NotFoundHandler(TracingHandlerMixin, RequestHandler):
+
+    trace_operation_name = 'not_found'
+
+    def get(self):
+        raise HTTPError(404)
+
+
+class TracingHandlerMixinTestCase(_HTTPBase):
+
+    def setUp(self):
+        super(TracingHandlerMixinTestCase, self).setUp()
+        del scopes[:]
+
+    def get_app(self):
+        return Application([
+            ('/', Handler),
+            ('/failed', FailedHandler),
+            ('/not_found', NotFoundHandler),
+        ])
+
+    def test_root_span(self):
+        response = self.fetch('/')
+        assert response.code == 200
+
+        handler, root, ff = self.wait_finished_spans(3)
+
+        assert root.operation_name == 'Handler'
+        assert root.tags['http.method'] == 'GET'
+        assert root.tags['http.status_code'] == 200
+        assert has_no_parent(root)
+        assert empty_span(handler, 'handler')
+        assert empty_span(ff, 'background')
+        assert is_parent_of(root, handler, ff)
+
+        # Fire & forget coroutine reuses scope of root span.
+        handler_scope, ff_scope = scopes
+        assert handler_scope is ff_scope
+        assert handler_scope.span is root
+
+    def test_incoming_context(self):
+        with global_tracer().start_active_span('client') as scope:
+            headers = {}
+            global_tracer().inject(scope.span.context, 'http_headers', headers)
+
+        self.fetch('/', headers=headers)
+
+        client, handler, root, ff = self.wait_finished_spans(4)
+        assert is_parent_of(client, root)
+        assert is_parent_of(root, handler, ff)
+
+    def test_unsampled_request(self):
+        for headers in (
+                {'X-B3-Sampled': '0'},
+                {'b3': '0'},
+                {'b3': '80f198ee56343ba8-e457b5a2e4d86bd1-0'},
+                {'uber-trace-id': '6e0c63257de34c92:bf1d2ec0:0:0'},
+                {'traceparent': '00-0af7651916cd43dd8448eb211c80319c-'
+                                'b7ad6b7169203331-00'},
+        ):
+            global_tracer().reset()
+            del scopes[:]
+            response = self.fetch('/', headers=headers)
+            assert response.code == 200
+
+            handler, root, ff = self.wait_finished_spans(3)
+            assert root.tags['sampling.priority'] == 0
+            assert is_parent_of(root, handler, ff)
+            # No new root traces.
+            assert [
+                span for span in (handler, root, ff) if has_no_parent(span)
+            ] == [root]
+
+            # Fire & forget coroutine skips tracing work.
+            handler_scope, ff_scope = scopes
+            assert not _is_sampled(ff_scope)
+
+    def test_sampled_request(self):
+        response = self.fetch('/', headers={
+            'uber-trace-id': '6e0c63257de34c92%3Abf1d2ec0%3A0%3A1'
+        })
+        assert response.code == 200
+        handler, root, ff = self.wait_finished_spans(3)
+        assert 'sampling.priority' not in root.tags
+        assert _is_sampled(scopes[1])
+
+    def test_exception(self):
+        response = self.fetch('/failed')
+        assert response.code == 500
+
+        root, = global_tracer().finished_spans()
+        assert root.operation_name == 'failed'
+        assert root.tags['error'] is True
+        assert root.tags['http.status_code'] == 500
+        assert str(root.logs[0].key_values['error.object']) == 'foobar'
+
+    def test_client_error(self):
+        response = self.fetch('/not_found')
+        assert response.code == 404
+
+        root, = global_tracer().finished_spans()
+        assert root.operation_name == 'not_found'
+        assert root.tags['http.status_code'] == 404
+        assert 'error' not in root.tags
+        assert root.logs == []
+
+    def test_disabled(self):
+        State.enabled = False
+        try:
+            response = self.fetch('/')
+        finally:
+            State.enabled = True
+        assert response.code == 200
+
+        handler, ff = self.wait_finished_spans(2)
+        assert has_no_parent(handler)
@@ -1,16 +1,79 @@
 # coding: utf-8
+import bisect
 import functools
+import logging
+import os
+import sys
+import threading
+import time
+import types
+import weakref
 from tornado import gen
+from tornado.concurrent import Future, chain_future
+from tornado.ioloop import IOLoop
+from tornado.stack_context import StackContext, NullContext
 from opentracing import global_tracer
+from opentracing.ext import tags
 from opentracing.scope_managers.tornado import _TracerRequestContext,\
     ThreadSafeStackContext, _TracerRequestContextManager, _TornadoScope
 
 
 original_gen_coroutine = gen.coroutine
 
+logger = logging.getLogger(__name__)
+
+_clock = getattr(time, 'perf_counter', time.time)
+_cpu_clock = getattr(time, 'thread_time', None) or \
+    getattr(time, 'process_time', None) or time.clock
+
+
+def _loop_time():
+    """
+    Time of the current IOLoop. Delays are measured by the same clock as
+    timeouts of IOLoop, e.g. virtual clock in tests.
+    """
+    loop = IOLoop.current(instance=False)
+    if loop is None:
+        return _clock()
+    return loop.time()
+
+
+def sampled_by_flags(span_context):
+    """
+    Default predicate of sampled traces. Reads `sampled` attribute (basic
+    tracer) or sampling bit of `flags` (Jaeger) of span context, traces of
+    other tracers are considered sampled.
+    """
+    sampled = getattr(span_context, 'sampled', None)
+    if sampled is not None:
+        return bool(sampled)
+    flags = getattr(span_context, 'flags', None)
+    if flags is not None:
+        return bool(flags & 1)
+    return True
+
 
 class State:
     enabled = True
+    is_sampled = staticmethod(sampled_by_flags)
+    # Count of logged failures of fire & forget coroutines per interval (in
+    # seconds), None disables the limit.
+    error_log_limit = 10
+    error_log_interval = 60.0
+    # Summary span of aggregated calls counts calls made during the interval
+    # (in seconds) since its start.
+    aggregate_interval = 1.0
+
+
+def set_sampling_predicate(predicate=None):
+    """
+    Set function that takes span context and returns whether its trace is
+    sampled. Fire & forget coroutines with unsampled parent span (and all
+    their descendants) are called without spans, timers and aggregation,
+    their request context only keeps the parent span. `None` restores the
+    default predicate `sampled_by_flags`.
+    """
+    State.is_sampled = staticmethod(predicate or sampled_by_flags)
 
 
 def tracer_stack_context(parent_span=None):
@@ -21,18 +84,118 @@ def tracer_stack_context(parent_span=None):
     """
     # TODO: remove this when the feature be released
     # https://github.com/opentracing/opentracing-python/pull/126
+    return _stack_context(_request_context(parent_span))
+
+
+class _BaseScope(_TornadoScope):
+    """
+    Scope of parent span that new request context is started with. It's never
+    closed, so could be shared by several request contexts.
+    """
+
+    def __init__(self, manager, span):
+        super(_BaseScope, self).__init__(manager, span, False)
+
+    def close(self):
+        pass
+
+
+class _UnsampledScope(_BaseScope):
+    """
+    Base scope of span that is known to be unsampled, e.g. root span of
+    request unsampled by caller, even if tracer can't tell it by context.
+    """
+
+
+def _is_sampled(scope):
+    return not isinstance(scope, _UnsampledScope) and \
+        State.is_sampled(scope.span.context)
+
+
+class _LocalContexts(threading.local):
+
+    def __init__(self):
+        super(_LocalContexts, self).__init__()
+        self._contexts = []
+
+    def append(self, item):
+        self._contexts.append(item)
+
+    def pop(self):
+        return self._contexts.pop()
+
+
+class _ThreadSafeStackContext(ThreadSafeStackContext):
+    """
+    `ThreadSafeStackContext` that doesn't define new class of thread local
+    storage per each instance.
+    """
+
+    def __init__(self, context_factory):
+        StackContext.__init__(self, context_factory)
+        self.contexts = _LocalContexts()
+
+
+class _MeasuredRequestContext(_TracerRequestContext):
+    """
+    Request context of coroutine with `measure_time` that lets timer of the
+    running step charge time to spans before the active scope is changed, so
+    spans closed inside the step get their share of it.
+    """
+
+    __slots__ = ('_active', 'timer')
+
+    def __init__(self, active=None):
+        self._active = active
+        self.timer = None
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, scope):
+        timer = self.timer
+        if timer is not None:
+            timer.checkpoint()
+        self._active = scope
+
+
+def _request_context(parent_span=None, context_class=_TracerRequestContext):
     if parent_span is not None:
-        scope = _TornadoScope(
-            global_tracer().scope_manager, parent_span, False)
+        scope = _BaseScope(global_tracer().scope_manager, parent_span)
     else:
         scope = None
-    context = _TracerRequestContext(scope)
-    return ThreadSafeStackContext(
+    return context_class(scope)
+
+
+def _active_request_context(scope, context_class=_TracerRequestContext):
+    """
+    Request context for fire & forget coroutine with span of the active
+    scope as parent. Base scope of the current context is reused if nothing
+    is activated over it, e.g. calling coroutine right inside another
+    fire & forget coroutine or request handler.
+    """
+    if scope is None:
+        return context_class(None)
+    if isinstance(scope, _BaseScope):
+        return context_class(scope)
+    return _request_context(scope.span, context_class)
+
+
+def _stack_context(context):
+    """
+    Stack context for already existing request context. Could be entered
+    several times to keep scopes activated inside the context between
+    entries.
+    """
+    return _ThreadSafeStackContext(
         lambda: _TracerRequestContextManager(context)
     )
 
 
-def ff_coroutine(func_or_coro):
+def ff_coroutine(func_or_coro=None, measure_time=False, operation_name=None,
+                 aggregate_after=None, spawn=False):
     """
     Extended `gen.coroutine` decorator that provides to fire & forget coroutine
     without losing parent scope while yielding it:
@@ -85,8 +248,76 @@ def ff_coroutine(func_or_coro):
                                            ...
     ```
 
+    3) With `measure_time` CPU and wall time spent inside the coroutine
+    between yields are measured. Time is added to tags `coroutine.cpu_time`
+    and `coroutine.wall_time` of spans while they are active in the
+    coroutine, including spans opened and closed inside one step, and to
+    aggregate of the function (see `coroutine_stats`):
+    ```
+        @ff_coroutine(measure_time=True)
+        def coro():
+            with global_tracer().start_active_span(
+                operation_name='child,
+                child_of=global_tracer().active_span
+            ):
+                # CPU time of the code below is set as tag of child span
+                ...
+    ```
+
+    4) With `operation_name` each call of the coroutine is wrapped by child
+    span of the active span. The span is finished when the coroutine is done,
+    time measured with `measure_time` is set as its tags.
+
+    With `aggregate_after` only first `aggregate_after` calls with the same
+    parent span are reported as individual spans. Further calls are counted
+    by summary span (tagged `ff.aggregated`) that becomes parent for spans
+    opened inside these coroutines. The summary span counts calls made during
+    `State.aggregate_interval` seconds since its start and is finished when
+    the interval is over and all counted coroutines are done, with count of
+    calls, count of errors and histogram of latency as tags. So long living
+    parent gets at most one summary span per interval:
+    ```
+        @ff_coroutine(operation_name='notify', aggregate_after=10)
+        def notify(user):
+            ...
+
+        with global_tracer().start_active_span('root'):
+            for user in users:
+                notify(user)
+    ```
+
+    Time from the call to completion of the coroutine is set as
+    `ff.completion_time` tag of its span.
+
+    5) Failures of fire & forget coroutines are counted by function and type
+    of exception (see `ff_error_stats`) and logged by logger of the module,
+    unless the exception is retrieved from the future (e.g. the caller awaits
+    it) until the next iteration of IOLoop. Only `State.error_log_limit`
+    failures are logged per `State.error_log_interval` seconds, others are
+    reported by summary at the end of the interval. Counted exceptions are
+    marked as retrieved, so unawaited futures don't log them once more when
+    collected.
+
+    6) With `spawn` the call doesn't run the first step of coroutine
+    immediately, but schedules it on the next iteration of IOLoop and returns
+    future of its result. Time between the call and the first step is set as
+    `ff.schedule_delay` tag of the span (average and maximum for summary
+    spans), it grows when IOLoop is saturated:
+    ```
+        @ff_coroutine(operation_name='notify', spawn=True)
+        def notify(user):
+            ...
+    ```
     """
 
+    if func_or_coro is None:
+        return functools.partial(
+            ff_coroutine,
+            measure_time=measure_time,
+            operation_name=operation_name,
+            aggregate_after=aggregate_after,
+            spawn=spawn,
+        )
     if hasattr(func_or_coro, '__ff_traced_coroutine__'):
         return func_or_coro
     if not gen.is_coroutine_function(func_or_coro):
@@ -94,13 +325,53 @@ def ff_coroutine(func_or_coro):
     else:
         coro = func_or_coro
 
+    name = _function_name(coro.__wrapped__)
+    on_done = functools.partial(_count_error, name)
+    context_class = _TracerRequestContext
+    if measure_time:
+        measured_coro = original_gen_coroutine(_measured(coro.__wrapped__))
+        context_class = _MeasuredRequestContext
+
+    def _call(args, kwargs):
+        if not measure_time:
+            return None, coro(*args, **kwargs)
+        coroutine_stats = _loop_state().coroutine_stats
+        stats = coroutine_stats.get(name)
+        if stats is None:
+            stats = coroutine_stats[name] = _CoroutineStats()
+        timer = _StepTimer(stats)
+        return timer, measured_coro(timer, *args, **kwargs)
+
+    def _plain_call(args, kwargs):
+        return None, coro(*args, **kwargs)
+
     @functools.wraps(coro)
     def _func(*args, **kwargs):
         if not State.enabled:
+            if spawn:
+                return _Launch(_plain_call, args, kwargs, spawn).future
             return coro(*args, **kwargs)
 
-        with tracer_stack_context(global_tracer().active_span):
-            return coro(*args, **kwargs)
+        scope = global_tracer().scope_manager.active
+        if scope is not None and not _is_sampled(scope):
+            # Nothing to report, the coroutine runs without spans, timers and
+            # aggregation. Own request context only keeps the parent, so
+            # scopes activated by the coroutine and the caller don't mix.
+            with _stack_context(_active_request_context(scope)):
+                if spawn:
+                    future = _Launch(_plain_call, args, kwargs, spawn).future
+                else:
+                    future = coro(*args, **kwargs)
+        elif operation_name is None:
+            with _stack_context(_active_request_context(scope, context_class)):
+                future = _Launch(_call, args, kwargs, spawn).future
+        else:
+            future = _call_in_span(
+                operation_name, aggregate_after, spawn, _call, args, kwargs,
+                scope and scope.span, context_class)
+
+        _on_done(future, on_done)
+        return future
 
     _func.__ff_traced_coroutine__ = True
 
@@ -108,3 +379,602 @@ def ff_coroutine(func_or_coro):
     _func.__wrapped__ = coro.__wrapped__
     _func.__tornado_coroutine__ = True
     return _func
+
+
+class _CoroutineStats(object):
+
+    __slots__ = ('calls', 'steps', 'cpu_time', 'wall_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.steps = 0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'steps': self.steps,
+            'cpu_time': self.cpu_time,
+            'wall_time': self.wall_time,
+        }
+
+
+def coroutine_stats():
+    """
+    Aggregated time of fire & forget coroutines decorated with
+    `measure_time`, by names of functions:
+    ```
+        {
+            'module.coro': {
+                'calls': 10,
+                'steps': 30,
+                'cpu_time': 0.012,
+                'wall_time': 0.015,
+            }
+        }
+    ```
+    """
+    result = {}
+    for state in _loop_states():
+        for name, stats in list(state.coroutine_stats.items()):
+            total = result.get(name)
+            if total is None:
+                result[name] = stats.as_dict()
+            else:
+                for key, value in stats.as_dict().items():
+                    total[key] += value
+    return result
+
+
+def reset_coroutine_stats():
+    for state in _loop_states():
+        state.coroutine_stats.clear()
+
+
+class _StepTimer(object):
+    """
+    Measures steps of one call of coroutine.
+    """
+
+    __slots__ = ('stats', 'spans', 'cpu_time', 'wall_time', 'context',
+                 '_previous', '_cpu_start', '_wall_start', '_cpu_mark',
+                 '_wall_mark')
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.spans = {}
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+        # Request context of the coroutine notifies the timer about changes
+        # of the active scope.
+        context = _TracerRequestContextManager.current_context()
+        if not isinstance(context, _MeasuredRequestContext):
+            context = None
+        self.context = context
+        self._previous = None
+        stats.calls += 1
+
+    def start(self):
+        self._wall_start = self._wall_mark = _clock()
+        self._cpu_start = self._cpu_mark = _cpu_clock()
+        context = self.context
+        if context is not None:
+            self._previous, context.timer = context.timer, self
+
+    def stop(self):
+        context = self.context
+        if context is not None:
+            context.timer, self._previous = self._previous, None
+        cpu_now, wall_now = self.checkpoint()
+        cpu_time = cpu_now - self._cpu_start
+        wall_time = wall_now - self._wall_start
+        self.cpu_time += cpu_time
+        self.wall_time += wall_time
+        stats = self.stats
+        stats.steps += 1
+        stats.cpu_time += cpu_time
+        stats.wall_time += wall_time
+
+    def checkpoint(self):
+        """
+        Charge time since the previous checkpoint to spans that are opened by
+        the coroutine and still active.
+        """
+        cpu_now = _cpu_clock()
+        wall_now = _clock()
+        cpu_time = cpu_now - self._cpu_mark
+        wall_time = wall_now - self._wall_mark
+        self._cpu_mark = cpu_now
+        self._wall_mark = wall_now
+
+        scope = global_tracer().scope_manager.active
+        while scope is not None and not isinstance(scope, _BaseScope):
+            span = scope.span
+            total = self.spans.get(span)
+            if total is None:
+                total = self.spans[span] = [0.0, 0.0]
+            total[0] += cpu_time
+            total[1] += wall_time
+            span.set_tag('coroutine.cpu_time', total[0])
+            span.set_tag('coroutine.wall_time', total[1])
+            scope = getattr(scope, '_to_restore', None)
+        return cpu_now, wall_now
+
+
+def _function_name(func):
+    return '{}.{}'.format(
+        func.__module__, getattr(func, '__qualname__', func.__name__))
+
+
+def _measured(func):
+    """
+    Wrap function of coroutine to measure time of its steps by timer passed
+    as first argument.
+    """
+
+    @functools.wraps(func)
+    def wrapper(timer, *args, **kwargs):
+        timer.start()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            timer.stop()
+            raise
+        if isinstance(result, types.GeneratorType):
+            # Steps of generator are measured by proxy.
+            return _measured_generator(result, timer)
+        timer.stop()
+        return result
+
+    return wrapper
+
+
+def _measured_generator(generator, timer):
+    """
+    Proxy of coroutine generator that measures time of each step.
+    """
+    value = None
+    exc_info = None
+    while True:
+        timer.start()
+        try:
+            if exc_info is None:
+                yielded = generator.send(value)
+            else:
+                try:
+                    yielded = generator.throw(*exc_info)
+                finally:
+                    exc_info = None
+        except (StopIteration, gen.Return) as e:
+            timer.stop()
+            raise gen.Return(getattr(e, 'value', None))
+        except Exception:
+            timer.stop()
+            raise
+        timer.stop()
+
+        try:
+            value = yield yielded
+        except GeneratorExit:
+            generator.close()
+            raise
+        except Exception:
+            value = None
+            exc_info = sys.exc_info()
+
+
+def _log_error(span, exc_type, exc, tb):
+    span.set_tag(tags.ERROR, True)
+    span.log_kv({
+        'event': tags.ERROR,
+        'error.kind': exc_type,
+        'error.object': exc,
+        'stack': tb,
+    })
+
+
+def _on_done(future, callback):
+    if future.done():
+        callback(future)
+    else:
+        future.add_done_callback(callback)
+
+
+def _future_exception(future):
+    if hasattr(future, 'exc_info'):
+        # Tornado's own Future.
+        return future.exc_info()
+    exc = future.exception()
+    if exc is None:
+        return None
+    return type(exc), exc, getattr(exc, '__traceback__', None)
+
+
+def _peek_exception(future):
+    """
+    Same as `_future_exception`, but doesn't mark the exception as retrieved,
+    so it's still known whether the caller retrieved it.
+    """
+    if hasattr(future, '_exc_info'):
+        # Tornado's own Future.
+        return future._exc_info
+    exc = future._exception
+    if exc is None:
+        return None
+    return type(exc), exc, getattr(exc, '__traceback__', None)
+
+
+def ff_error_stats():
+    """
+    Count of failures of fire & forget coroutines by names of functions and
+    types of exceptions:
+    ```
+        {
+            'module.coro': {
+                'ConnectionError': 1000,
+                'ValueError': 1,
+            }
+        }
+    ```
+    """
+    result = {}
+    for state in _loop_states():
+        for (name, exc_type), count in list(state.error_stats.items()):
+            counts = result.setdefault(name, {})
+            counts[exc_type] = counts.get(exc_type, 0) + count
+    return result
+
+
+def reset_ff_error_stats():
+    for state in _loop_states():
+        state.error_stats.clear()
+        state.error_log.reset()
+
+
+class _ErrorLog(object):
+    """
+    Logs failures of fire & forget coroutines with limited rate. Failures
+    over the limit are reported by summary at the end of the interval.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.interval_start = None
+        self.logged = 0
+        self.suppressed = {}
+        self.summary_scheduled = False
+
+    def add(self, name, exc_info):
+        now = _loop_time()
+        interval = State.error_log_interval
+        start = self.interval_start
+        if start is None or now - start >= interval:
+            self.flush()
+            self.interval_start = now
+            self.logged = 0
+
+        limit = State.error_log_limit
+        if limit is None or self.logged < limit:
+            self.logged += 1
+            logger.error('Fire & forget coroutine %s failed', name,
+                         exc_info=exc_info)
+            return
+
+        key = (name, exc_info[0].__name__)
+        self.suppressed[key] = self.suppressed.get(key, 0) + 1
+        if not self.summary_scheduled:
+            self.summary_scheduled = True
+            with NullContext():
+                IOLoop.current().call_later(
+                    interval - (now - self.interval_start), self.flush)
+
+    def flush(self):
+        self.summary_scheduled = False
+        if not self.suppressed:
+            return
+        suppressed, self.suppressed = self.suppressed, {}
+        logger.error(
+            'Fire & forget coroutines failed %d times more: %s',
+            sum(suppressed.values()),
+            ', '.join(
+                '{} ({}): {}'.format(name, exc_type, count)
+                for (name, exc_type), count in sorted(suppressed.items())
+            )
+        )
+
+
+def _count_error(name, future):
+    if future.cancelled() or _peek_exception(future) is None:
+        return
+    # Caller awaiting the future retrieves the exception by callbacks of the
+    # next iteration of IOLoop, timeouts are run after them.
+    with NullContext():
+        IOLoop.current().call_later(
+            0, _count_unretrieved_error, name, future)
+
+
+def _count_unretrieved_error(name, future):
+    if not future._log_traceback:
+        return
+    exc_info = _future_exception(future)
+    state = _loop_state()
+    error_stats = state.error_stats
+    key = (name, exc_info[0].__name__)
+    error_stats[key] = error_stats.get(key, 0) + 1
+    state.error_log.add(name, exc_info)
+
+
+class _Launch(object):
+    """
+    Call of fire & forget coroutine, immediate or scheduled on the next
+    iteration of IOLoop (`spawn`).
+    """
+
+    __slots__ = ('call', 'args', 'kwargs', 'launched', 'started', 'timer',
+                 'future')
+
+    def __init__(self, call, args, kwargs, spawn):
+        self.launched = _loop_time()
+        if not spawn:
+            self.started = self.launched
+            self.timer, self.future = call(args, kwargs)
+            return
+        self.call = call
+        self.args = args
+        self.kwargs = kwargs
+        self.started = None
+        self.timer = None
+        self.future = Future()
+        # Callback is wrapped by the current stack context.
+        IOLoop.current().add_callback(self.run)
+
+    def run(self):
+        self.started = _loop_time()
+        self.timer, future = self.call(self.args, self.kwargs)
+        self.call = self.args = self.kwargs = None
+        chain_future(future, self.future)
+
+
+def _call_in_span(operation_name, aggregate_after, spawn, call, args, kwargs,
+                  parent, context_class=_TracerRequestContext):
+    tracer = global_tracer()
+
+    summary = None
+    if aggregate_after is not None and parent is not None:
+        summary = _Summary.get(parent, operation_name, aggregate_after)
+    if summary is not None:
+        with _stack_context(context_class(summary.scope)):
+            launch = _Launch(call, args, kwargs, spawn)
+        summary.add(launch, spawn)
+        return launch.future
+
+    span = tracer.start_span(operation_name=operation_name, child_of=parent)
+    with _stack_context(_request_context(span, context_class)):
+        launch = _Launch(call, args, kwargs, spawn)
+
+    def finish(future):
+        span.set_tag('ff.completion_time', _loop_time() - launch.launched)
+        if spawn:
+            span.set_tag('ff.schedule_delay', launch.started - launch.launched)
+        timer = launch.timer
+        if timer is not None:
+            span.set_tag('coroutine.cpu_time', timer.cpu_time)
+            span.set_tag('coroutine.wall_time', timer.wall_time)
+        exc_info = _peek_exception(future)
+        if exc_info is not None:
+            _log_error(span, *exc_info)
+        span.finish()
+
+    _on_done(launch.future, finish)
+    return launch.future
+
+
+# Upper bounds (in seconds) of latency histogram of summary spans.
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+_LATENCY_TAGS = tuple(
+    'ff.latency.le_{}ms'.format(int(bound * 1000))
+    for bound in _LATENCY_BUCKETS
+) + ('ff.latency.gt_{}ms'.format(int(_LATENCY_BUCKETS[-1] * 1000)), )
+
+
+class _FanOut(object):
+
+    __slots__ = ('reported', 'summary')
+
+    def __init__(self):
+        self.reported = 0
+        self.summary = None
+
+
+class _Summary(object):
+    """
+    Summary span that counts aggregated calls of fire & forget coroutine.
+    """
+
+    def __init__(self, parent, operation_name, fan_out):
+        tracer = global_tracer()
+        self.span = tracer.start_span(
+            operation_name=operation_name,
+            child_of=parent,
+            tags={'ff.aggregated': True}
+        )
+        self.scope = _BaseScope(tracer.scope_manager, self.span)
+        self.fan_out = fan_out
+        self.closed = False
+        self.pending = 0
+        self.count = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.buckets = [0] * len(_LATENCY_TAGS)
+        self.spawned = 0
+        self.schedule_delay = 0.0
+        self.max_schedule_delay = 0.0
+        with NullContext():
+            IOLoop.current().call_later(State.aggregate_interval, self.close)
+
+    @classmethod
+    def get(cls, parent, operation_name, aggregate_after):
+        """
+        Summary span that should count the call, None if the call should be
+        reported as individual span.
+        """
+        try:
+            loop_fan_outs = _loop_state().fan_outs
+            fan_outs = loop_fan_outs.get(parent)
+            if fan_outs is None:
+                fan_outs = loop_fan_outs[parent] = {}
+        except TypeError:
+            # Span doesn't support weak references.
+            return None
+        fan_out = fan_outs.get(operation_name)
+        if fan_out is None:
+            fan_out = fan_outs[operation_name] = _FanOut()
+        if fan_out.reported < aggregate_after:
+            fan_out.reported += 1
+            return None
+        if fan_out.summary is None:
+            fan_out.summary = cls(parent, operation_name, fan_out)
+        return fan_out.summary
+
+    def add(self, launch, spawn):
+        self.pending += 1
+        self.count += 1
+
+        def done(future):
+            latency = _loop_time() - launch.launched
+            if spawn:
+                delay = launch.started - launch.launched
+                self.spawned += 1
+                self.schedule_delay += delay
+                if delay > self.max_schedule_delay:
+                    self.max_schedule_delay = delay
+            self.latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+            self.buckets[bisect.bisect_left(_LATENCY_BUCKETS, latency)] += 1
+            if _peek_exception(future) is not None:
+                self.errors += 1
+            self.pending -= 1
+            if self.closed and not self.pending:
+                self.finish()
+
+        _on_done(launch.future, done)
+
+    def close(self):
+        """
+        Stop counting new calls, they start the next summary span.
+        """
+        self.closed = True
+        if self.fan_out.summary is self:
+            self.fan_out.summary = None
+        if not self.pending:
+            self.finish()
+
+    def finish(self):
+        span = self.span
+        span.set_tag('ff.count', self.count)
+        span.set_tag('ff.errors', self.errors)
+        span.set_tag('ff.latency.avg', self.latency / self.count)
+        span.set_tag('ff.latency.max', self.max_latency)
+        if self.spawned:
+            span.set_tag('ff.schedule_delay.avg',
+                         self.schedule_delay / self.spawned)
+            span.set_tag('ff.schedule_delay.max', self.max_schedule_delay)
+        for tag, count in zip(_LATENCY_TAGS, self.buckets):
+            if count:
+                span.set_tag(tag, count)
+        if self.errors:
+            span.set_tag(tags.ERROR, True)
+        span.finish()
+
+
+class _LoopState(object):
+    """
+    Mutable state of the library that belongs to one IOLoop. Coroutines of
+    IOLoop running in other thread or process never touch it.
+    """
+
+    def __init__(self):
+        # Function name -> _CoroutineStats.
+        self.coroutine_stats = {}
+        # (Function name, exception type name) -> count of failures.
+        self.error_stats = {}
+        self.error_log = _ErrorLog()
+        # Parent span -> operation name -> _FanOut.
+        self.fan_outs = weakref.WeakKeyDictionary()
+
+    def merge(self, other):
+        """
+        Add statistics of other state.
+        """
+        for name, other_stats in list(other.coroutine_stats.items()):
+            stats = self.coroutine_stats.get(name)
+            if stats is None:
+                stats = self.coroutine_stats[name] = _CoroutineStats()
+            stats.calls += other_stats.calls
+            stats.steps += other_stats.steps
+            stats.cpu_time += other_stats.cpu_time
+            stats.wall_time += other_stats.wall_time
+        for key, count in list(other.error_stats.items()):
+            self.error_stats[key] = self.error_stats.get(key, 0) + count
+
+
+# id(IOLoop) -> (weak reference to IOLoop, _LoopState).
+_states = {}
+_states_lock = threading.RLock()
+# State of code running outside of IOLoop, it also keeps statistics of
+# collected IOLoops.
+_no_loop_state = _LoopState()
+
+
+def _loop_state():
+    loop = IOLoop.current(instance=False)
+    if loop is None:
+        return _no_loop_state
+    key = id(loop)
+    entry = _states.get(key)
+    if entry is not None and entry[0]() is loop:
+        return entry[1]
+    state = _LoopState()
+    with _states_lock:
+        _states[key] = (weakref.ref(loop, _retire_callback(key)), state)
+    return state
+
+
+def _retire_callback(key):
+
+    def retire(ref):
+        with _states_lock:
+            entry = _states.get(key)
+            if entry is None or entry[0] is not ref:
+                return
+            del _states[key]
+            _no_loop_state.merge(entry[1])
+
+    return retire
+
+
+def _loop_states():
+    with _states_lock:
+        return [state for _, state in _states.values()] + [_no_loop_state]
+
+
+def reset_after_fork():
+    """
+    Drop state inherited from parent process: statistics, pending summaries
+    of errors and aggregated spans. Called automatically in child process
+    where `os.register_at_fork` is available (Python 3.7+), otherwise should
+    be called right after `tornado.process.fork_processes`.
+    """
+    global _states, _states_lock, _no_loop_state
+    _states_lock = threading.RLock()
+    _states = {}
+    _no_loop_state = _LoopState()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
@@ -0,0 +1,251 @@
+# coding: utf-8
+import functools
+import sys
+
+from opentracing import global_tracer
+from tornado.escape import utf8
+from tornado.util import unicode_type
+
+from . import State, _request_context, _stack_context, _clock,\
+    _loop_time, _log_error, _is_sampled
+
+try:
+    _StopAsyncIteration = StopAsyncIteration
+except NameError:
+    # Python 2 has no asynchronous iterators.
+    _StopAsyncIteration = ()
+
+
+def traced_iterator(func=None, operation_name=None, log_chunks=False):
+    """
+    Decorator of generator (or any function that returns iterator or
+    asynchronous iterator) that keeps parent span active across every step
+    of the iterator:
+    ```
+        @traced_iterator
+        def produce():
+            with global_tracer().start_active_span(
+                operation_name='produce',
+                child_of=global_tracer().active_span
+            ):
+                for chunk in ...:
+                    yield chunk
+
+        class Handler(RequestHandler):
+            @gen.coroutine
+            def get(self):
+                with global_tracer().start_active_span('get'):
+                    for chunk in produce():
+                        self.write(chunk)
+                        yield self.flush()
+    ```
+
+    Iterator is wrapped by span (named `operation_name`, name of the function
+    by default) that is child of the span active while the function is
+    called. Steps of the iterator are executed in own stack context with this
+    span active, so scopes activated inside the iterator stay active between
+    steps and don't interfere with scopes of the consumer.
+
+    Count of chunks, their size in bytes and latency of steps are set as tags
+    of the span when the iterator is exhausted or closed. Set `log_chunks` to
+    log every chunk as well.
+    """
+
+    if func is None:
+        return functools.partial(
+            traced_iterator,
+            operation_name=operation_name,
+            log_chunks=log_chunks
+        )
+
+    @functools.wraps(func)
+    def _func(*args, **kwargs):
+        return trace_iterator(
+            func(*args, **kwargs),
+            operation_name or func.__name__,
+            log_chunks
+        )
+
+    return _func
+
+
+def trace_iterator(iterable, operation_name='stream', log_chunks=False):
+    """
+    Wrap iterable or asynchronous iterable, see `traced_iterator`.
+    """
+    if not State.enabled:
+        return iterable
+    scope = global_tracer().scope_manager.active
+    if scope is not None and not _is_sampled(scope):
+        return iterable
+    if hasattr(iterable, '__anext__'):
+        return TracedAsyncIterator(iterable, operation_name, log_chunks)
+    if hasattr(iterable, '__aiter__'):
+        return TracedAsyncIterator(
+            iterable.__aiter__(), operation_name, log_chunks)
+    return TracedIterator(iter(iterable), operation_name, log_chunks)
+
+
+class _TracedStream(object):
+
+    def __init__(self, iterator, operation_name, log_chunks=False):
+        tracer = global_tracer()
+        self.span = tracer.start_span(
+            operation_name=operation_name,
+            child_of=tracer.active_span
+        )
+        self.chunks = 0
+        self.bytes = 0
+        self._iterator = iterator
+        self._log_chunks = log_chunks
+        self._context = _request_context(self.span)
+        self._latency = 0.0
+        self._max_latency = 0.0
+        self._finished = False
+
+    def __del__(self):
+        if not getattr(self, '_finished', True):
+            self._finish()
+
+    def close(self):
+        """
+        Close underlying iterator and finish the span. Call it when the
+        iterator is not exhausted.
+        """
+        try:
+            close = getattr(self._iterator, 'close', None)
+            if close is not None:
+                with _stack_context(self._context):
+                    close()
+        finally:
+            self._finish()
+
+    def _step(self, func, *args):
+        with _stack_context(self._context):
+            return func(*args)
+
+    def _chunk(self, chunk, latency):
+        self.chunks += 1
+        self._latency += latency
+        if latency > self._max_latency:
+            self._max_latency = latency
+        if isinstance(chunk, (bytes, bytearray)):
+            size = len(chunk)
+        elif isinstance(chunk, unicode_type):
+            size = len(utf8(chunk))
+        else:
+            size = 0
+        self.bytes += size
+        if self._log_chunks:
+            self.span.log_kv({
+                'event': 'chunk',
+                'chunk.bytes': size,
+                'chunk.latency': latency,
+            })
+
+    def _finish(self, exc_info=None):
+        if self._finished:
+            return
+        self._finished = True
+        span = self.span
+        span.set_tag('stream.chunks', self.chunks)
+        span.set_tag('stream.bytes', self.bytes)
+        if self.chunks:
+            span.set_tag('stream.chunk_latency.avg',
+                         self._latency / self.chunks)
+            span.set_tag('stream.chunk_latency.max', self._max_latency)
+        if exc_info is not None:
+            _log_error(span, *exc_info)
+        span.finish()
+
+
+class TracedIterator(_TracedStream):
+    """
+    Iterator that executes steps of wrapped iterator in own stack context.
+    """
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = _clock()
+        try:
+            chunk = self._step(next, self._iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception:
+            self._finish(sys.exc_info())
+            raise
+        self._chunk(chunk, _clock() - start)
+        return chunk
+
+    next = __next__
+
+
+class TracedAsyncIterator(_TracedStream):
+    """
+    Asynchronous iterator that executes steps of wrapped asynchronous
+    iterator in own stack context. Each resumption of awaitable returned by
+    `__anext__` enters the context again, so it works with native coroutines
+    as well as with Tornado ones.
+    """
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        start = _loop_time()
+        try:
+            awaitable = self._step(self._iterator.__anext__)
+        except Exception:
+            self._finish(sys.exc_info())
+            raise
+        return _TracedAwaitable(self, awaitable, start)
+
+    def _resume(self, start, func, *args):
+        try:
+            return self._step(func, *args)
+        except StopIteration as e:
+            self._chunk(e.value, _loop_time() - start)
+            raise
+        except _StopAsyncIteration:
+            self._finish()
+            raise
+        except Exception:
+            self._finish(sys.exc_info())
+            raise
+
+
+class _TracedAwaitable(object):
+    """
+    Awaitable that proxies steps of another one through
+    `TracedAsyncIterator._resume`.
+    """
+
+    def __init__(self, stream, awaitable, start):
+        self._stream = stream
+        self._start = start
+        self._iterator = awaitable.__await__()
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def send(self, value):
+        return self._stream._resume(
+            self._start, self._iterator.send, value)
+
+    def throw(self, *exc_info):
+        return self._stream._resume(
+            self._start, self._iterator.throw, *exc_info)
+
+    def close(self):
+        close = getattr(self._iterator, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,269 @@
+# coding: utf-8
+import collections
+import json
+import logging
+import sqlite3
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from opentracing import global_tracer, Format, UnsupportedFormatException,\
+    InvalidCarrierException, SpanContextCorruptedException
+
+from . import State, tracer_stack_context, original_gen_coroutine
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend(object):
+    """
+    Job queue backend that keeps jobs in memory of the current process.
+    Jobs don't survive restart of the process.
+
+    Backend has `put_many(jobs)`, `get_many(count)` that returns list of
+    pairs `(job_id, job)` taken by consumer, and `ack(job_ids)` called when
+    the taken jobs are done.
+    """
+
+    def __init__(self):
+        self._jobs = collections.deque()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def put_many(self, jobs):
+        self._jobs.extend(jobs)
+
+    def get_many(self, count):
+        jobs = []
+        while self._jobs and len(jobs) < count:
+            jobs.append((None, self._jobs.popleft()))
+        return jobs
+
+    def ack(self, job_ids):
+        pass
+
+
+class SQLiteBackend(object):
+    """
+    Job queue backend that stores jobs in SQLite database file, so they
+    survive restart of the process. Jobs are serialized as JSON, therefore
+    arguments of jobs must be JSON serializable.
+
+    Jobs are removed from the file only when they are done (at least once
+    delivery): jobs taken, but not acknowledged before restart of the
+    process are taken again.
+    """
+
+    def __init__(self, path, table='ff_jobs'):
+        self.table = table
+        # Jobs are taken in order of ids, taken ones are kept until ack.
+        self._last_taken_id = 0
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS {} ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'payload TEXT NOT NULL)'.format(table)
+            )
+
+    def __len__(self):
+        cursor = self._connection.execute(
+            'SELECT COUNT(*) FROM {}'.format(self.table))
+        return cursor.fetchone()[0]
+
+    def put_many(self, jobs):
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO {} (payload) VALUES (?)'.format(self.table),
+                [(json.dumps(job), ) for job in jobs]
+            )
+
+    def get_many(self, count):
+        rows = self._connection.execute(
+            'SELECT id, payload FROM {} WHERE id > ? ORDER BY id '
+            'LIMIT ?'.format(self.table),
+            (self._last_taken_id, count)
+        ).fetchall()
+        if rows:
+            self._last_taken_id = rows[-1][0]
+        return [(job_id, json.loads(payload)) for job_id, payload in rows]
+
+    def ack(self, job_ids):
+        with self._connection:
+            self._connection.executemany(
+                'DELETE FROM {} WHERE id = ?'.format(self.table),
+                [(job_id, ) for job_id in job_ids]
+            )
+
+    def close(self):
+        self._connection.close()
+
+
+class JobQueue(object):
+    """
+    Queue of fire & forget jobs that keeps trace context of producer.
+
+    Producer side puts jobs with `ff_enqueue`. Jobs are buffered and written
+    to the backend by batches: when `batch_size` jobs are collected or on the
+    next iteration of IOLoop, whichever comes first.
+
+    Consumer side registers handlers of jobs and drains the queue:
+    ```
+        queue = JobQueue(SQLiteBackend('/var/lib/app/jobs.sqlite'))
+
+        @queue.handler('send_email')
+        def send_email(address):
+            yield ...
+
+        # Producer.
+        with global_tracer().start_active_span('request'):
+            ff_enqueue(queue, 'send_email', 'foo@example.com')
+
+        # Consumer.
+        queue.consume()
+    ```
+
+    Each job is run by consumer in a child span of the span that was active
+    while the job was enqueued. Jobs are acknowledged to the backend when all
+    jobs of the batch are done, successfully or not.
+    """
+
+    def __init__(self, backend=None, batch_size=100):
+        self.backend = MemoryBackend() if backend is None else backend
+        self.batch_size = batch_size
+        self._handlers = {}
+        self._buffer = []
+        self._flush_scheduled = False
+        self._consuming = False
+
+    def put(self, name, args=(), kwargs=None):
+        self._buffer.append({
+            'name': name,
+            'args': list(args),
+            'kwargs': kwargs or {},
+            'context': _inject_active_context(),
+        })
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            IOLoop.current().spawn_callback(self.flush)
+
+    def flush(self):
+        """
+        Write buffered jobs to the backend.
+        """
+        self._flush_scheduled = False
+        if self._buffer:
+            jobs, self._buffer = self._buffer, []
+            self.backend.put_many(jobs)
+
+    def handler(self, name=None, operation_name=None):
+        """
+        Decorator that registers function or coroutine as handler of jobs
+        with given name (name of the function by default). Job is run in span
+        named `operation_name` (name of the job by default).
+        """
+
+        def decorator(func):
+            if gen.is_coroutine_function(func):
+                coro = func
+            else:
+                coro = original_gen_coroutine(func)
+            job_name = name or func.__name__
+            self._handlers[job_name] = (coro, operation_name or job_name)
+            return func
+
+        return decorator
+
+    @gen.coroutine
+    def drain(self):
+        """
+        Take one batch of jobs from the backend and run them concurrently.
+        Returns count of the taken jobs.
+        """
+        self.flush()
+        taken = self.backend.get_many(self.batch_size)
+        futures = [self._run(job) for _, job in taken]
+        for (_, job), future in zip(taken, futures):
+            if future is None:
+                continue
+            try:
+                yield future
+            except Exception:
+                logger.exception('Job %r failed', job['name'])
+        if taken:
+            self.backend.ack([job_id for job_id, _ in taken])
+        raise gen.Return(len(taken))
+
+    @gen.coroutine
+    def consume(self, poll_interval=1.0):
+        """
+        Drain the queue until `stop` is called. Sleeps `poll_interval`
+        seconds when the queue is exhausted.
+        """
+        self._consuming = True
+        while self._consuming:
+            count = yield self.drain()
+            if count < self.batch_size and self._consuming:
+                yield gen.sleep(poll_interval)
+
+    def stop(self):
+        self._consuming = False
+
+    def _run(self, job):
+        try:
+            coro, operation_name = self._handlers[job['name']]
+        except KeyError:
+            logger.warning('No handler for job %r, job dropped', job['name'])
+            return None
+
+        if not State.enabled:
+            return coro(*job['args'], **job['kwargs'])
+
+        with tracer_stack_context():
+            return self._run_traced(coro, operation_name, job)
+
+    @gen.coroutine
+    def _run_traced(self, coro, operation_name, job):
+        with global_tracer().start_active_span(
+                operation_name=operation_name,
+                child_of=_extract_context(job['context']),
+        ):
+            result = yield coro(*job['args'], **job['kwargs'])
+        raise gen.Return(result)
+
+
+def ff_enqueue(queue, name, *args, **kwargs):
+    """
+    Fire & forget job through `JobQueue` instead of invoking coroutine
+    directly. Context of the active span is stored with the job, so consumer
+    runs it as child span.
+    """
+    queue.put(name, args, kwargs)
+
+
+def _inject_active_context():
+    if not State.enabled:
+        return None
+    tracer = global_tracer()
+    span = tracer.active_span
+    if span is None:
+        return None
+    carrier = {}
+    try:
+        tracer.inject(span.context, Format.TEXT_MAP, carrier)
+    except UnsupportedFormatException:
+        return None
+    return carrier
+
+
+def _extract_context(carrier):
+    if not carrier:
+        return None
+    try:
+        return global_tracer().extract(Format.TEXT_MAP, carrier)
+    except (UnsupportedFormatException, InvalidCarrierException,
+            SpanContextCorruptedException):
+        return None
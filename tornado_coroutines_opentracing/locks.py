@@ -0,0 +1,282 @@
+# coding: utf-8
+import collections
+
+from tornado import locks
+from opentracing import global_tracer
+
+from . import State, _loop_time
+
+
+class _LockStats(object):
+
+    __slots__ = ('acquisitions', 'contentions', 'timeouts', 'wait_time',
+                 'max_wait_time', 'hold_time', 'max_hold_time')
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contentions = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.hold_time = 0.0
+        self.max_hold_time = 0.0
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class _ConditionStats(object):
+
+    __slots__ = ('waits', 'timeouts', 'wait_time', 'max_wait_time')
+
+    def __init__(self):
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+def _log(span, name, event, key, value):
+    if span is None:
+        return
+    fields = {'event': event, key: value}
+    if name is not None:
+        fields['lock'] = name
+    span.log_kv(fields)
+
+
+class _Waiter(object):
+
+    __slots__ = ('future', 'span', 'start', 'recorded')
+
+    def __init__(self, future, span, start):
+        self.future = future
+        self.span = span
+        self.start = start
+        self.recorded = False
+
+
+class _TracedWaiters(object):
+    """
+    Traced waiters in order of waiters of tornado's primitive. Timed out
+    waiters are occasionally cleared like tornado does with its own ones.
+    """
+
+    __slots__ = ('_waiters', '_timeouts')
+
+    def __init__(self):
+        self._waiters = collections.deque()
+        self._timeouts = 0
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def append(self, waiter):
+        self._waiters.append(waiter)
+
+    def pop_woken(self):
+        """
+        Waiters that are woken up (or timed out) in front of the queue.
+        """
+        waiters = self._waiters
+        while waiters and waiters[0].future.done():
+            yield waiters.popleft()
+
+    def timed_out(self):
+        self._timeouts += 1
+        if self._timeouts > 100:
+            self._timeouts = 0
+            self._waiters = collections.deque(
+                waiter for waiter in self._waiters if not waiter.recorded)
+
+
+class _TracedSemaphoreMixin(object):
+    """
+    Records time of waiting for acquisition and time of holding the semaphore
+    as logs of the span active while it's acquired, and aggregates them by
+    counters of the semaphore (see `stats`).
+
+    Releases aren't bound to acquisitions, so hold time is measured from the
+    earliest acquisition that isn't released yet.
+    """
+
+    def __init__(self, value=1, name=None):
+        super(_TracedSemaphoreMixin, self).__init__(value)
+        self.name = name
+        self._stats = _LockStats()
+        self._holds = collections.deque()
+        self._traced_waiters = _TracedWaiters()
+
+    def stats(self):
+        """
+        Counters of acquisitions (`acquisitions`, `contentions` - count of
+        acquisitions that waited, `timeouts`) with total and maximal time of
+        waiting (`wait_time`, `max_wait_time`) and holding (`hold_time`,
+        `max_hold_time`).
+        """
+        return self._stats.as_dict()
+
+    def acquire(self, timeout=None):
+        if not State.enabled:
+            return super(_TracedSemaphoreMixin, self).acquire(timeout)
+
+        span = global_tracer().active_span
+        start = _loop_time()
+        future = super(_TracedSemaphoreMixin, self).acquire(timeout)
+        if future.done():
+            self._acquired(span, start, 0.0)
+            return future
+
+        self._stats.contentions += 1
+        waiter = _Waiter(future, span, start)
+        self._traced_waiters.append(waiter)
+        # Timeouts are recorded by callback, acquisitions are recorded by
+        # `release` before the waiting coroutine is resumed.
+        future.add_done_callback(lambda future: self._waited(waiter))
+        return future
+
+    def release(self):
+        if self._holds:
+            span, start = self._holds.popleft()
+            hold_time = _loop_time() - start
+            stats = self._stats
+            stats.hold_time += hold_time
+            if hold_time > stats.max_hold_time:
+                stats.max_hold_time = hold_time
+            _log(span, self.name, 'lock.released',
+                 'lock.hold_time', hold_time)
+        super(_TracedSemaphoreMixin, self).release()
+
+        # Waiters are woken up in order of acquisition.
+        for waiter in self._traced_waiters.pop_woken():
+            self._waited(waiter)
+
+    def _waited(self, waiter):
+        if waiter.recorded:
+            return
+        waiter.recorded = True
+        wait_time = _loop_time() - waiter.start
+        if waiter.future.exception() is not None:
+            self._stats.timeouts += 1
+            self._traced_waiters.timed_out()
+            _log(waiter.span, self.name, 'lock.timeout',
+                 'lock.wait_time', wait_time)
+        else:
+            self._acquired(waiter.span, waiter.start, wait_time)
+
+    def _acquired(self, span, start, wait_time):
+        stats = self._stats
+        stats.acquisitions += 1
+        stats.wait_time += wait_time
+        if wait_time > stats.max_wait_time:
+            stats.max_wait_time = wait_time
+        self._holds.append((span, start + wait_time))
+        _log(span, self.name, 'lock.acquired', 'lock.wait_time', wait_time)
+
+
+class Semaphore(_TracedSemaphoreMixin, locks.Semaphore):
+    """
+    `tornado.locks.Semaphore` that records wait and hold time on the active
+    span:
+    ```
+        semaphore = Semaphore(10, name='db')
+
+        @ff_coroutine
+        def coro():
+            with global_tracer().start_active_span(
+                operation_name='query',
+                child_of=global_tracer().active_span
+            ):
+                with (yield semaphore.acquire()):
+                    ...
+    ```
+
+    The span gets log `lock.acquired` with `lock.wait_time` field when the
+    semaphore is acquired and log `lock.released` with `lock.hold_time` field
+    when it's released (`lock.timeout` if acquisition timed out). Aggregated
+    counters are returned by `stats`.
+
+    When tracing is disabled (`State.enabled`) nothing is recorded.
+    """
+
+
+class BoundedSemaphore(_TracedSemaphoreMixin, locks.BoundedSemaphore):
+    """
+    `tornado.locks.BoundedSemaphore` that records wait and hold time on the
+    active span like `Semaphore`.
+    """
+
+
+class Lock(locks.Lock):
+    """
+    `tornado.locks.Lock` that records wait and hold time on the active span
+    like `Semaphore`.
+    """
+
+    def __init__(self, name=None):
+        super(Lock, self).__init__()
+        self._block = BoundedSemaphore(value=1, name=name)
+
+    @property
+    def name(self):
+        return self._block.name
+
+    def stats(self):
+        return self._block.stats()
+
+
+class Condition(locks.Condition):
+    """
+    `tornado.locks.Condition` that records time of waiting for notification
+    as log `condition.notified` (or `condition.timeout`) with
+    `condition.wait_time` field on the active span. Aggregated counters
+    (`waits`, `timeouts`, `wait_time`, `max_wait_time`) are returned by
+    `stats`.
+    """
+
+    def __init__(self, name=None):
+        super(Condition, self).__init__()
+        self.name = name
+        self._stats = _ConditionStats()
+        self._traced_waiters = _TracedWaiters()
+
+    def stats(self):
+        return self._stats.as_dict()
+
+    def wait(self, timeout=None):
+        future = super(Condition, self).wait(timeout)
+        if not State.enabled:
+            return future
+
+        waiter = _Waiter(future, global_tracer().active_span, _loop_time())
+        self._traced_waiters.append(waiter)
+        future.add_done_callback(lambda future: self._waited(waiter))
+        return future
+
+    def notify(self, n=1):
+        super(Condition, self).notify(n)
+
+        # Record notified waiters before they are resumed.
+        for waiter in self._traced_waiters.pop_woken():
+            self._waited(waiter)
+
+    def _waited(self, waiter):
+        if waiter.recorded:
+            return
+        waiter.recorded = True
+        wait_time = _loop_time() - waiter.start
+        stats = self._stats
+        stats.waits += 1
+        stats.wait_time += wait_time
+        if wait_time > stats.max_wait_time:
+            stats.max_wait_time = wait_time
+        if waiter.future.result():
+            event = 'condition.notified'
+        else:
+            stats.timeouts += 1
+            self._traced_waiters.timed_out()
+            event = 'condition.timeout'
+        _log(waiter.span, self.name, event, 'condition.wait_time', wait_time)
@@ -0,0 +1,205 @@
+# coding: utf-8
+import functools
+import types
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.queues import Queue, QueueEmpty, _set_timeout
+from opentracing import global_tracer, child_of
+
+from . import State, original_gen_coroutine, _request_context,\
+    _stack_context, _loop_time, _log_error, _on_done, _future_exception
+
+
+class _Envelope(object):
+    """
+    Item of the queue with context of the span that was active while the item
+    was put.
+    """
+
+    __slots__ = ('item', 'context', 'put_time')
+
+    def __init__(self, item, context, put_time):
+        self.item = item
+        self.context = context
+        self.put_time = put_time
+
+
+def _wrap(item):
+    if isinstance(item, _Envelope):
+        return item
+    context = None
+    if State.enabled:
+        span = global_tracer().active_span
+        if span is not None:
+            context = span.context
+    return _Envelope(item, context, _loop_time())
+
+
+class TracedQueue(Queue):
+    """
+    `tornado.queues.Queue` that captures context of the active span with
+    every item put by producer:
+    ```
+        queue = TracedQueue()
+
+        # Producer.
+        with global_tracer().start_active_span('request'):
+            yield queue.put(item)
+
+        # Worker.
+        @gen.coroutine
+        def handle(item):
+            ...
+
+        @gen.coroutine
+        def worker():
+            while True:
+                yield queue.process(handle)
+    ```
+
+    `process` takes the next item and runs handler with it in span that is
+    child of the producer's span. The handler is executed in own stack
+    context with the span active, time the item spent in the queue is set as
+    `queue.wait_time` tag of the span. `process_many` runs handler with batch
+    of items in one span that is child of all producers' spans.
+
+    `get`, `get_nowait` and `get_many` return items as is, without tracing.
+    Items put by unsampled traces are processed without span as well.
+    """
+
+    def put(self, item, timeout=None):
+        return super(TracedQueue, self).put(_wrap(item), timeout)
+
+    def put_nowait(self, item):
+        super(TracedQueue, self).put_nowait(_wrap(item))
+
+    @gen.coroutine
+    def get(self, timeout=None):
+        envelope = yield self._get_envelope(timeout)
+        raise gen.Return(envelope.item)
+
+    def get_nowait(self):
+        return super(TracedQueue, self).get_nowait().item
+
+    @gen.coroutine
+    def get_many(self, max_items, timeout=None):
+        """
+        Wait for an item and return list of up to `max_items` items available
+        in the queue.
+        """
+        envelopes = yield self._get_envelopes(max_items, timeout)
+        raise gen.Return([envelope.item for envelope in envelopes])
+
+    @gen.coroutine
+    def process(self, handler, operation_name=None, timeout=None):
+        """
+        Wait for an item and run `handler` (function or coroutine) with it in
+        span named `operation_name` (name of the handler by default). The item
+        is marked as done when the handler is done. Returns result of the
+        handler.
+        """
+        envelope = yield self._get_envelope(timeout)
+        try:
+            result = yield _run(
+                handler, operation_name, [envelope], envelope.item)
+        finally:
+            self.task_done()
+        raise gen.Return(result)
+
+    @gen.coroutine
+    def process_many(self, handler, max_items, operation_name=None,
+                     timeout=None):
+        """
+        Wait for an item and run `handler` with list of up to `max_items`
+        available items in one span. Maximum wait time of the items is set as
+        `queue.wait_time` tag and count of them as `queue.items` tag.
+        """
+        envelopes = yield self._get_envelopes(max_items, timeout)
+        try:
+            result = yield _run(
+                handler, operation_name, envelopes,
+                [envelope.item for envelope in envelopes])
+        finally:
+            for _ in envelopes:
+                self.task_done()
+        raise gen.Return(result)
+
+    def _get_envelope(self, timeout=None):
+        # Same as `Queue.get`, but resolves to the envelope: waiting getters
+        # receive envelopes from `put_nowait` directly.
+        future = Future()
+        try:
+            future.set_result(super(TracedQueue, self).get_nowait())
+        except QueueEmpty:
+            self._getters.append(future)
+            _set_timeout(future, timeout)
+        return future
+
+    @gen.coroutine
+    def _get_envelopes(self, max_items, timeout=None):
+        envelope = yield self._get_envelope(timeout)
+        envelopes = [envelope]
+        while len(envelopes) < max_items:
+            try:
+                envelopes.append(super(TracedQueue, self).get_nowait())
+            except QueueEmpty:
+                break
+        raise gen.Return(envelopes)
+
+
+@original_gen_coroutine
+def _call(handler, argument):
+    """
+    Run handler that isn't coroutine function, e.g. `functools.partial` of
+    coroutine or plain function.
+    """
+    result = handler(argument)
+    if isinstance(result, types.GeneratorType):
+        result = yield original_gen_coroutine(lambda: result)()
+    elif gen.is_future(result) or hasattr(result, '__await__'):
+        result = yield result
+    raise gen.Return(result)
+
+
+def _run(handler, operation_name, envelopes, argument):
+    if gen.is_coroutine_function(handler):
+        coro = handler
+    else:
+        coro = functools.partial(_call, handler)
+
+    if not State.enabled:
+        return coro(argument)
+
+    contexts = [
+        envelope.context for envelope in envelopes
+        if envelope.context is not None
+    ]
+    sampled = [context for context in contexts if State.is_sampled(context)]
+    if contexts and not sampled:
+        return coro(argument)
+
+    now = _loop_time()
+    span_tags = {
+        'queue.wait_time': max(now - envelope.put_time
+                               for envelope in envelopes),
+    }
+    if len(envelopes) > 1:
+        span_tags['queue.items'] = len(envelopes)
+    span = global_tracer().start_span(
+        operation_name=operation_name or getattr(
+            handler, '__name__', 'queue.process'),
+        references=[child_of(context) for context in sampled],
+        tags=span_tags
+    )
+    with _stack_context(_request_context(span)):
+        future = coro(argument)
+
+    def finish(future):
+        exc_info = _future_exception(future)
+        if exc_info is not None:
+            _log_error(span, *exc_info)
+        span.finish()
+
+    _on_done(future, finish)
+    return future
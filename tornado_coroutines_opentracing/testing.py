@@ -0,0 +1,268 @@
+# coding: utf-8
+import opentracing
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+from tornado.platform.select import SelectIOLoop
+from tornado.testing import AsyncTestCase, AsyncHTTPTestCase
+from opentracing.mocktracer import MockTracer
+from opentracing.scope_managers.tornado import TornadoScopeManager
+
+try:
+    import asyncio
+    import selectors
+    from tornado.platform.asyncio import AsyncIOLoop, BaseAsyncIOLoop
+except ImportError:
+    # Python 2 or Tornado without asyncio integration.
+    asyncio = None
+
+
+class VirtualClock(object):
+    """
+    Clock of IOLoop created by `virtual_time_io_loop`. Time doesn't flow by
+    itself: when IOLoop has nothing to do but wait for the next timeout, the
+    clock jumps to the timeout instantly. So `gen.sleep(60)` takes no real
+    time while callbacks are run in the same order as with real clock.
+
+    IOLoop waits real I/O up to `autojump_threshold` seconds of real time
+    before jumping, set it for tests that talk to sockets.
+    """
+
+    def __init__(self, start=0.0, autojump_threshold=0.0):
+        self.now = start
+        self.autojump_threshold = autojump_threshold
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        now = self.now + seconds
+        if now <= self.now:
+            # Too small step for the current value of the clock.
+            now = self.now + 1e-9
+        self.now = now
+
+    def _select(self, select, timeout):
+        events = select(0)
+        if events or timeout == 0:
+            return events
+        threshold = self.autojump_threshold
+        if threshold:
+            if timeout is not None and timeout < threshold:
+                threshold = timeout
+            events = select(threshold)
+            if events:
+                return events
+        if timeout is None:
+            # Nothing is scheduled, only I/O could wake up IOLoop.
+            return select(None)
+        self.advance(timeout)
+        return []
+
+
+class _AutojumpPoller(object):
+    """
+    Poller of `PollIOLoop` that advances virtual clock instead of waiting.
+    """
+
+    def __init__(self, impl, clock):
+        self._impl = impl
+        self._clock = clock
+
+    def __getattr__(self, name):
+        return getattr(self._impl, name)
+
+    def poll(self, timeout):
+        return self._clock._select(self._impl.poll, timeout)
+
+
+class _VirtualTimeSelectIOLoop(SelectIOLoop):
+
+    def initialize(self, clock, **kwargs):
+        self.clock = clock
+        super(_VirtualTimeSelectIOLoop, self).initialize(
+            time_func=clock.time, **kwargs)
+        self._impl = _AutojumpPoller(self._impl, clock)
+
+
+if asyncio is not None:
+
+    class _AutojumpSelector(selectors.DefaultSelector):
+
+        def __init__(self, clock):
+            super(_AutojumpSelector, self).__init__()
+            self._clock = clock
+
+        def select(self, timeout=None):
+            return self._clock._select(
+                super(_AutojumpSelector, self).select, timeout)
+
+    class _VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+
+        def __init__(self, clock):
+            self._virtual_clock = clock
+            super(_VirtualTimeEventLoop, self).__init__(
+                _AutojumpSelector(clock))
+
+        def time(self):
+            return self._virtual_clock.now
+
+    class _VirtualTimeAsyncIOLoop(AsyncIOLoop):
+
+        def initialize(self, clock, **kwargs):
+            self.clock = clock
+            self.is_current = False
+            loop = _VirtualTimeEventLoop(clock)
+            try:
+                BaseAsyncIOLoop.initialize(self, loop, **kwargs)
+            except Exception:
+                loop.close()
+                raise
+
+        def time(self):
+            # Timeouts are scheduled relative to this time.
+            return self.clock.now
+
+
+def virtual_time_io_loop(clock=None, **kwargs):
+    """
+    New IOLoop driven by `VirtualClock` (available as `clock` attribute of
+    the loop). It's asyncio event loop where Tornado runs on asyncio, and
+    `SelectIOLoop` otherwise.
+    """
+    if clock is None:
+        clock = VirtualClock()
+    if asyncio is not None and \
+            issubclass(IOLoop.configured_class(), BaseAsyncIOLoop):
+        return _VirtualTimeAsyncIOLoop(clock=clock, **kwargs)
+    return _VirtualTimeSelectIOLoop(clock=clock, **kwargs)
+
+
+class _NotifyingMockTracer(MockTracer):
+
+    def __init__(self, *args, **kwargs):
+        super(_NotifyingMockTracer, self).__init__(*args, **kwargs)
+        self.finish_callbacks = []
+
+    def _append_finished_span(self, span):
+        super(_NotifyingMockTracer, self)._append_finished_span(span)
+        for callback in list(self.finish_callbacks):
+            callback()
+
+
+class TracingTestMixin(object):
+    """
+    Mixin of `tornado.testing.AsyncTestCase` that runs test in IOLoop with
+    virtual clock (`self.clock`) and installs `MockTracer` with
+    `TornadoScopeManager` as global tracer (`self.tracer`).
+    """
+
+    autojump_threshold = 0.0
+
+    def setUp(self):
+        # IOLoop is created by setUp of the test case.
+        self.clock = VirtualClock(autojump_threshold=self.autojump_threshold)
+        super(TracingTestMixin, self).setUp()
+        self._global_tracer = opentracing.global_tracer()
+        self.tracer = _NotifyingMockTracer(TornadoScopeManager())
+        opentracing.set_global_tracer(self.tracer)
+
+    def tearDown(self):
+        opentracing.set_global_tracer(self._global_tracer)
+        super(TracingTestMixin, self).tearDown()
+
+    def get_new_ioloop(self):
+        return virtual_time_io_loop(self.clock)
+
+    def wait_finished_spans(self, count, timeout=600.0):
+        """
+        Run IOLoop until `count` spans are finished (at most `timeout` seconds
+        of virtual time, which are skipped instantly) and return finished
+        spans.
+        """
+        future = Future()
+
+        def check():
+            if len(self.tracer.finished_spans()) >= count and \
+                    not future.done():
+                future.set_result(None)
+
+        def on_finish():
+            # Spans could be finished in other threads.
+            self.io_loop.add_callback(check)
+
+        self.tracer.finish_callbacks.append(on_finish)
+        try:
+            check()
+            self.io_loop.run_sync(lambda: future, timeout)
+        finally:
+            self.tracer.finish_callbacks.remove(on_finish)
+        finished_spans = self.tracer.finished_spans()
+        assert len(finished_spans) == count
+        return finished_spans
+
+    def assert_no_orphans(self):
+        """
+        Every finished span with parent has its parent finished.
+        """
+        orphans = find_orphans(self.tracer.finished_spans())
+        assert orphans == [], 'Spans with unknown parent: {}'.format(
+            ', '.join(span.operation_name for span in orphans))
+
+
+class TracingTestCase(TracingTestMixin, AsyncTestCase):
+    """
+    Test case of code with fire & forget coroutines:
+    ```
+        class TestCase(TracingTestCase):
+
+            def test_coro(self):
+                with global_tracer().start_active_span('root'):
+                    coro()  # sleeps for a minute
+
+                root, child = self.wait_finished_spans(2)
+                assert is_parent_of(root, child)
+                self.assert_no_orphans()
+    ```
+    """
+
+
+class TracingHTTPTestCase(TracingTestMixin, AsyncHTTPTestCase):
+    """
+    `TracingTestCase` for HTTP applications. IOLoop waits responses up to
+    `autojump_threshold` seconds of real time before jumping to the next
+    timeout.
+    """
+
+    autojump_threshold = 0.05
+
+
+def is_parent_of(parent_span, *children):
+    for child in children:
+        assert parent_span.context.span_id == child.parent_id, \
+            '{} is not parent of {}'.format(
+                parent_span.operation_name, child.operation_name)
+    return True
+
+
+def is_not_parent_of(parent_span, *children):
+    for child in children:
+        assert parent_span.context.span_id != child.parent_id, \
+            '{} is parent of {}'.format(
+                parent_span.operation_name, child.operation_name)
+    return True
+
+
+def has_no_parent(span):
+    return span.parent_id is None
+
+
+def find_orphans(spans):
+    """
+    Spans which parents aren't among given spans, e.g. parent span is never
+    finished or child is started with wrong active span.
+    """
+    span_ids = set(span.context.span_id for span in spans)
+    return [
+        span for span in spans
+        if span.parent_id is not None and span.parent_id not in span_ids
+    ]
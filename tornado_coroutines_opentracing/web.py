@@ -0,0 +1,146 @@
+# coding: utf-8
+from opentracing import global_tracer, Format, UnsupportedFormatException,\
+    InvalidCarrierException, SpanContextCorruptedException
+from opentracing.ext import tags
+from opentracing.scope_managers.tornado import _TracerRequestContext
+from tornado.web import HTTPError
+
+from . import State, _BaseScope, _UnsampledScope, _stack_context, _log_error
+
+
+class TracingHandlerMixin(object):
+    """
+    Mixin of `tornado.web.RequestHandler` that starts root span of request
+    and executes the handler inside single `tracer_stack_context`:
+    ```
+        class Handler(TracingHandlerMixin, RequestHandler):
+
+            @gen.coroutine
+            def get(self):
+                # parent span will be root span of the request
+                do_something_in_background()
+                ...
+    ```
+
+    Root span is child of span context extracted from headers of request.
+    Fire & forget coroutines called right inside the handler reuse scope of
+    the root span instead of creating new one.
+
+    Requests that aren't sampled according to incoming headers (see
+    `trace_sampled`) or to sampling predicate applied to incoming span context
+    (see `set_sampling_predicate`) still get root span, which is tagged with
+    `sampling.priority` 0 and is child of incoming context, so spans started
+    by the handler belong to the caller's unsampled trace instead of starting
+    new ones. Fire & forget coroutines called inside such request skip all
+    tracing work.
+    """
+
+    trace_operation_name = None
+
+    _trace_span = None
+
+    def trace_sampled(self):
+        """
+        Whether the request should be traced. By default honors sampling
+        decision of caller passed in B3, Jaeger or W3C Trace Context headers.
+        """
+        return _sampled_by_headers(self.request.headers)
+
+    def _execute(self, transforms, *args, **kwargs):
+        if not State.enabled:
+            return super(TracingHandlerMixin, self)._execute(
+                transforms, *args, **kwargs)
+
+        parent = _extract_context(self.request.headers)
+        sampled = self.trace_sampled() and \
+            (parent is None or State.is_sampled(parent))
+        span_tags = {
+            tags.SPAN_KIND: tags.SPAN_KIND_RPC_SERVER,
+            tags.HTTP_METHOD: self.request.method,
+            tags.HTTP_URL: self.request.uri,
+        }
+        if not sampled:
+            # Hint for tracer that can't tell it by incoming context.
+            span_tags[tags.SAMPLING_PRIORITY] = 0
+
+        tracer = global_tracer()
+        self._trace_span = tracer.start_span(
+            operation_name=self.trace_operation_name or type(self).__name__,
+            child_of=parent,
+            tags=span_tags
+        )
+        scope_class = _BaseScope if sampled else _UnsampledScope
+        scope = scope_class(tracer.scope_manager, self._trace_span)
+        with _stack_context(_TracerRequestContext(scope)):
+            return super(TracingHandlerMixin, self)._execute(
+                transforms, *args, **kwargs)
+
+    def log_exception(self, typ, value, tb):
+        # Client errors aren't errors of the request, like in
+        # `_finish_trace_span`.
+        client_error = isinstance(value, HTTPError) and \
+            value.status_code < 500
+        if self._trace_span is not None and not client_error:
+            _log_error(self._trace_span, typ, value, tb)
+        super(TracingHandlerMixin, self).log_exception(typ, value, tb)
+
+    def on_finish(self):
+        self._finish_trace_span()
+        super(TracingHandlerMixin, self).on_finish()
+
+    def on_connection_close(self):
+        self._finish_trace_span()
+        super(TracingHandlerMixin, self).on_connection_close()
+
+    def _finish_trace_span(self):
+        span = self._trace_span
+        if span is None:
+            return
+        self._trace_span = None
+        status = self.get_status()
+        span.set_tag(tags.HTTP_STATUS_CODE, status)
+        if status >= 500:
+            span.set_tag(tags.ERROR, True)
+        span.finish()
+
+
+def _extract_context(headers):
+    try:
+        return global_tracer().extract(Format.HTTP_HEADERS, headers)
+    except (UnsupportedFormatException, InvalidCarrierException,
+            SpanContextCorruptedException):
+        return None
+
+
+def _sampled_by_headers(headers):
+    """
+    Sampling decision passed by caller, True when there is no decision.
+    """
+    sampled = headers.get('X-B3-Sampled')
+    if sampled is not None:
+        return sampled.lower() in ('1', 'true', 'd')
+
+    b3 = headers.get('b3')
+    if b3 is not None:
+        parts = b3.split('-')
+        if len(parts) == 1:
+            return parts[0] != '0'
+        if len(parts) >= 3:
+            return parts[2] != '0'
+        return True
+
+    uber_trace_id = headers.get('uber-trace-id')
+    if uber_trace_id is not None:
+        uber_trace_id = uber_trace_id.replace('%3A', ':')
+    return _flags_sampled(uber_trace_id, ':', 3) and \
+        _flags_sampled(headers.get('traceparent'), '-', 3)
+
+
+def _flags_sampled(value, separator, index):
+    if value is None:
+        return True
+    parts = value.split(separator)
+    try:
+        return bool(int(parts[index], 16) & 1)
+    except (IndexError, ValueError):
+        return True